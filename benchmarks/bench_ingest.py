@@ -0,0 +1,28 @@
+"""
+Throughput of building annotations from export rows.
+
+Usage: python benchmarks/bench_ingest.py [n_annotations]
+"""
+import sys
+import time
+
+from linalgo.annotate.models import Annotation, Registry
+from bench_models import make_rows
+
+
+def main(n=100000):
+    rows = make_rows(n)
+    with Registry():
+        start = time.time()
+        [Annotation.from_dict(row) for row in rows]
+        elapsed = time.time() - start
+    print(f'from_dict:    {n / elapsed:10.0f} rows/s')
+    with Registry():
+        start = time.time()
+        Annotation.from_records(rows)
+        elapsed = time.time() - start
+    print(f'from_records: {n / elapsed:10.0f} rows/s')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,48 @@
+"""
+Memory footprint of annotations loaded from an export.
+
+Usage: python benchmarks/bench_models.py [n_annotations]
+"""
+import sys
+import tracemalloc
+import uuid
+
+from linalgo.annotate.models import Annotation
+
+
+def make_rows(n, n_documents=1000, n_entities=10, n_annotators=20):
+    documents = [uuid.uuid4().hex for _ in range(n_documents)]
+    entities = [uuid.uuid4().hex for _ in range(n_entities)]
+    annotators = [uuid.uuid4().hex for _ in range(n_annotators)]
+    task = uuid.uuid4().hex
+    rows = []
+    for i in range(n):
+        document = documents[i % n_documents]
+        rows.append({
+            'id': uuid.uuid4().hex,
+            'entity': entities[i % n_entities],
+            'annotator': annotators[i % n_annotators],
+            'document': document,
+            'task': task,
+            'body': '',
+            'created': '2020-08-17T21:38:07.281714+00:00',
+            'target': str({
+                'source': document,
+                'selector': [{'x': 1.5, 'y': 2.5, 'width': 10.,
+                              'height': 20.}]
+            })
+        })
+    return rows
+
+
+def main(n=100000):
+    rows = make_rows(n)
+    tracemalloc.start()
+    annotations = [Annotation.from_dict(row) for row in rows]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{len(annotations)} annotations: {current / n:.0f} bytes/annotation')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,74 @@
+"""
+Splitting a synthetic OCR page into layout blocks with LazyLayoutNavigator.
+
+Usage: python benchmarks/bench_navigator.py [n_words]
+"""
+import random
+import sys
+import time
+
+from linalgo.annotate.bbox import BoundingBox
+from linalgo.annotate.navigator import LazyLayoutNavigator
+
+
+def make_page(n_words=10000, words_per_paragraph=50, paragraphs_per_block=4,
+              seed=0):
+    """A page of words laid out in rows, grouped in paragraphs and blocks."""
+    rng = random.Random(seed)
+    content, layout = [], []
+    paragraph, block = [], []
+
+    def close(boxes, kind):
+        layout.append({'type': kind, 'bbox': BoundingBox(
+            left=min(b.left for b in boxes), right=max(b.right for b in boxes),
+            top=min(b.top for b in boxes),
+            bottom=max(b.bottom for b in boxes))})
+
+    per_row = 100
+    for i in range(n_words):
+        x, y = (i % per_row) * 12., (i // per_row) * 20.
+        bbox = BoundingBox(left=x, right=x + rng.uniform(6, 11), top=y,
+                           bottom=y + rng.uniform(12, 18))
+        content.append({'type': 'google', 'text': f'w{i}', 'bbox': bbox})
+        layout.append({'type': 'WORD', 'bbox': bbox})
+        paragraph.append(bbox)
+        if len(paragraph) == words_per_paragraph or i == n_words - 1:
+            close(paragraph, 'PARAGRAPH')
+            block.extend(paragraph)
+            paragraph = []
+        if len(block) == words_per_paragraph * paragraphs_per_block or \
+                (i == n_words - 1 and len(block)):
+            close(block, 'BLOCK')
+            block = []
+    return content, layout
+
+
+def naive_get(navigator, name):
+    parents = [p for p in navigator._layout if p['type'] == name]
+    return [[c for c in navigator._content if c['bbox'].overlap(p['bbox']) > .6]
+            for p in parents]
+
+
+def main(n=10000):
+    content, layout = make_page(n)
+    navigator = LazyLayoutNavigator(content, layout)
+    for name in ('BLOCK', 'PARAGRAPH'):
+        start = time.time()
+        navigators = navigator.get(name)
+        texts = [n.content() for n in navigators]
+        print(f'get({name!r}).content(): {time.time() - start:.2f}s for '
+              f'{len(texts)} navigators over {len(layout)} blocks')
+    navigator = LazyLayoutNavigator(content, layout)
+    start = time.time()
+    branch = navigator.children()[0]
+    while len(branch.children()):
+        branch = branch.children()[0]
+    print(f'walk one branch down to {branch}: '
+          f'{(time.time() - start) * 1000:.1f}ms')
+    start = time.time()
+    naive_get(navigator, 'PARAGRAPH')
+    print(f'linear scan of content only: {time.time() - start:.2f}s')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,36 @@
+"""
+Planning a scheduling round for many annotators over a large task.
+
+Usage: python benchmarks/bench_scheduler.py [n_docs] [n_annotators] [quota]
+"""
+import sys
+import time
+
+from linalgo.hub.scheduler import Scheduler
+from linalgo.tests.fixtures import make_schedule
+
+
+def main(n_docs=1000000, n_annotators=200, quota=2000):
+    start = time.time()
+    task, schedule = make_schedule(n_docs // 5, n_docs, n_annotators)
+    print(f'fixture: {time.time() - start:.2f}s')
+    start = time.time()
+    scheduler = Scheduler(task, schedule)
+    print(f'init: {time.time() - start:.2f}s for {len(schedule)} statuses')
+    deltas = schedule[:1000].assign(status='C')
+    start = time.time()
+    scheduler.update(deltas, unassigned=schedule['id'][1000:2000])
+    print(f'update: {(time.time() - start) * 1000:.1f}ms for '
+          f'{2 * len(deltas)} changes')
+    reviews = [(f'annotator-{i}', f'annotator-{i + 1}', 10)
+               for i in range(n_annotators - 1)]
+    start = time.time()
+    assignments, reviews = scheduler.plan(
+        quota, overlap=3, reviews=reviews, seed=0)
+    n = sum(len(docs) for docs in assignments.values())
+    print(f'plan: {time.time() - start:.2f}s for {n} assignments and '
+          f'{len(reviews)} review pairs')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,34 @@
+"""
+Loading and querying a columnar AnnotationStore.
+
+Usage: python benchmarks/bench_store.py [n_annotations]
+"""
+import sys
+import time
+
+from linalgo.annotate.store import AnnotationStore
+from bench_models import make_rows
+
+
+def main(n=1000000):
+    rows = make_rows(n)
+    start = time.time()
+    store = AnnotationStore.from_records(rows)
+    print(f'from_records: {time.time() - start:.2f}s for {len(store)} rows')
+    annotator = store.decode('annotator', [0])[0]
+    start = time.time()
+    store.filter(annotator=annotator, entity=store.decode('entity', [0, 1]))
+    print(f'filter: {(time.time() - start) * 1000:.1f}ms')
+    start = time.time()
+    store.groupby_count(('document', 'entity'))
+    print(f'groupby_count: {(time.time() - start) * 1000:.1f}ms')
+    start = time.time()
+    store.latest(by=('document', 'annotator'))
+    print(f'latest: {(time.time() - start) * 1000:.1f}ms')
+    start = time.time()
+    store.vote()
+    print(f'vote: {(time.time() - start) * 1000:.1f}ms')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
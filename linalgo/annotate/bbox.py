@@ -1,10 +1,16 @@
-from typing import List
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import os
+from typing import Iterable, List
 
+import numpy as np
 from PIL import Image, ImageDraw
 
 
 class Vertex:
 
+    __slots__ = ('x', 'y')
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
@@ -15,6 +21,8 @@ class Vertex:
 
 class BoundingBox:
 
+    __slots__ = ('left', 'right', 'top', 'bottom')
+
     def __init__(self, left, right, top, bottom):
         self.left = left
         self.right = right
@@ -75,41 +83,335 @@ class BoundingBox:
         return BoundingBox(left, right, top, bottom)
 
     def overlap(self, bbox):
-        if self.area <= 0:
+        area = self.area
+        if area <= 0 or not self.intersects(bbox):
             return 0
-        intersection = self.intersection(bbox)
-        return intersection.area / self.area
+        width = min(self.right, bbox.right) - max(self.left, bbox.left)
+        height = min(self.bottom, bbox.bottom) - max(self.top, bbox.top)
+        return width * height / area
 
     def __repr__(self):
         return f"{{{', '.join(f'{v}' for v in self.vertices)}}}"
 
 
-def draw_bounding_boxes(image: Image, annotations: List):
+class BoundingBoxArray:
+    """
+    Many bounding boxes stored as an (N, 4) array of
+    `(left, top, right, bottom)` rows for vectorized geometry.
+
+    Methods taking `other` accept a `BoundingBox`, which gives one value
+    per box, or a `BoundingBoxArray` of M boxes, which gives an (N, M)
+    matrix of every pair.
+    """
+
+    __slots__ = ('coords',)
+
+    def __init__(self, coords):
+        self.coords = np.asarray(coords, dtype=np.float64).reshape(-1, 4)
+
+    def __len__(self):
+        return len(self.coords)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, (int, np.integer)):
+            left, top, right, bottom = self.coords[idx].tolist()
+            return BoundingBox(left, right, top, bottom)
+        return BoundingBoxArray(self.coords[idx])
+
+    def __iter__(self):
+        for left, top, right, bottom in self.coords.tolist():
+            yield BoundingBox(left, right, top, bottom)
+
+    def __repr__(self):
+        return f'BoundingBoxArray::{len(self)} boxes'
+
+    @classmethod
+    def from_bboxes(cls, bboxes: List[BoundingBox]):
+        return cls([(b.left, b.top, b.right, b.bottom) for b in bboxes])
+
+    @classmethod
+    def from_selectors(cls, selectors: List[dict]):
+        """Build from `{'x', 'y', 'height', 'width'}` selector dicts."""
+        xywh = np.array([(s['x'], s['y'], s['width'], s['height'])
+                         for s in selectors], dtype=np.float64).reshape(-1, 4)
+        # width and height can be negative
+        x0, x1 = xywh[:, 0], xywh[:, 0] + xywh[:, 2]
+        y0, y1 = xywh[:, 1], xywh[:, 1] + xywh[:, 3]
+        return cls(np.stack([np.minimum(x0, x1), np.minimum(y0, y1),
+                             np.maximum(x0, x1), np.maximum(y0, y1)], axis=1))
+
+    def to_bboxes(self) -> List[BoundingBox]:
+        return list(self)
+
+    def to_selectors(self) -> List[dict]:
+        """Selector dicts as serialized by `BoundingBoxSerializer`."""
+        return [{'x': left, 'y': top, 'height': bottom - top,
+                 'width': right - left}
+                for left, top, right, bottom in self.coords.tolist()]
+
+    @property
+    def left(self):
+        return self.coords[:, 0]
+
+    @property
+    def top(self):
+        return self.coords[:, 1]
+
+    @property
+    def right(self):
+        return self.coords[:, 2]
+
+    @property
+    def bottom(self):
+        return self.coords[:, 3]
+
+    @property
+    def height(self):
+        return self.bottom - self.top
+
+    @property
+    def width(self):
+        return self.right - self.left
+
+    @property
+    def area(self):
+        return self.height * self.width
+
+    @property
+    def vertices(self):
+        """An (N, 4, 2) array of the corners, clockwise from top left."""
+        left, top, right, bottom = self.coords.T
+        return np.stack([
+            np.stack([left, top], axis=1), np.stack([right, top], axis=1),
+            np.stack([right, bottom], axis=1), np.stack([left, bottom], axis=1)
+        ], axis=1)
+
+    def _pairs(self, other):
+        if isinstance(other, BoundingBox):
+            other = np.array([other.left, other.top, other.right,
+                              other.bottom], dtype=np.float64)
+            return self.coords.T, other
+        if isinstance(other, BoundingBoxArray):
+            other = other.coords
+        other = np.asarray(other, dtype=np.float64).reshape(-1, 4)
+        return self.coords.T[:, :, None], other.T[:, None, :]
+
+    def contains(self, other):
+        (left, top, right, bottom), o = self._pairs(other)
+        return ((left <= o[0]) & (top <= o[1]) & (right >= o[2]) &
+                (bottom >= o[3]))
+
+    def intersects(self, other):
+        (left, top, right, bottom), o = self._pairs(other)
+        return ((left <= o[2]) & (o[0] <= right) & (top <= o[3]) &
+                (o[1] <= bottom))
+
+    def intersection(self, other):
+        """Area of the intersection of the boxes."""
+        (left, top, right, bottom), o = self._pairs(other)
+        width = np.minimum(right, o[2]) - np.maximum(left, o[0])
+        height = np.minimum(bottom, o[3]) - np.maximum(top, o[1])
+        return np.clip(width, 0, None) * np.clip(height, 0, None)
+
+    def overlap(self, other):
+        """Share of the area of each box covered by `other`."""
+        area = self.area
+        if not isinstance(other, BoundingBox):
+            area = area[:, None]
+        inter = self.intersection(other)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(area > 0, inter / area, 0.)
+
+    def iou(self, other):
+        """Intersection over union of the boxes."""
+        area = self.area
+        if isinstance(other, BoundingBox):
+            other_area = other.area
+        else:
+            other = BoundingBoxArray(getattr(other, 'coords', other))
+            area, other_area = area[:, None], other.area[None, :]
+        inter = self.intersection(other)
+        union = area + other_area - inter
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(union > 0, inter / union, 0.)
+
+
+class GridIndex:
+    """
+    Uniform grid over a list of bounding boxes to find the boxes that
+    intersect a query box without comparing it to every box.
+
+    Parameters
+    ----------
+    bboxes: List[BoundingBox]
+        The indexed boxes
+    cell_size: float
+        The side of a grid cell, defaults to the median width or height of
+        the boxes, whichever is larger
+    """
+
+    max_cells = 256
+
+    def __init__(self, bboxes: List[BoundingBox], cell_size: float = None):
+        self.boxes = BoundingBoxArray.from_bboxes(bboxes)
+        self.coords = self.boxes.coords
+        if cell_size is None:
+            sizes = np.concatenate([self.coords[:, 2] - self.coords[:, 0],
+                                    self.coords[:, 3] - self.coords[:, 1]])
+            sizes = sizes[sizes > 0]
+            cell_size = float(np.median(sizes)) if len(sizes) else 1.
+        self.cell_size = cell_size
+        self.origin = self.coords[:, :2].min(axis=0) if len(self) else (0, 0)
+        self.cells = {}
+        # boxes spanning many cells are checked on every query instead
+        self.large = []
+        for i, (x0, y0, x1, y1) in enumerate(self._cell_ranges(self.coords)):
+            if (x1 - x0 + 1) * (y1 - y0 + 1) > self.max_cells:
+                self.large.append(i)
+                continue
+            for x in range(x0, x1 + 1):
+                for y in range(y0, y1 + 1):
+                    self.cells.setdefault((x, y), []).append(i)
+
+    def __len__(self):
+        return len(self.coords)
+
+    def _cell_ranges(self, coords):
+        cells = np.floor(
+            (coords - np.tile(self.origin, 2)) / self.cell_size)
+        return np.nan_to_num(cells).astype(np.int64).tolist()
+
+    def query(self, bbox: BoundingBox) -> List[int]:
+        """
+        Return
+        ------
+        The sorted indices of the boxes that intersect `bbox`, borders
+        included, as `BoundingBox.intersects` does
+        """
+        coords = np.array([[bbox.left, bbox.top, bbox.right, bbox.bottom]],
+                          dtype=np.float64)
+        x0, y0, x1, y1 = self._cell_ranges(coords)[0]
+        n_cells = (x1 - x0 + 1) * (y1 - y0 + 1)
+        if n_cells >= len(self.cells):
+            candidates = np.arange(len(self))
+        else:
+            found = [self.cells.get((x, y), ())
+                     for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+            found.append(self.large)
+            candidates = np.unique(np.fromiter(
+                (i for ids in found for i in ids), dtype=np.int64))
+        hits = self.boxes[candidates].intersects(bbox)
+        return candidates[hits].tolist()
+
+
+def annotation_boxes(annotations: List, default_color='red'):
+    """
+    Gather the boxes of annotations with a bounding box selector.
+
+    Return
+    ------
+    A tuple `(boxes, colors)` of a `BoundingBoxArray` and the color of the
+    entity of each box
+    """
+    palette = {}
+    bboxes, colors = [], []
+    for annotation in annotations:
+        target = annotation.target
+        if target is None or len(target.selectors) == 0:
+            continue
+        box = target.selectors[0]
+        if type(box) != BoundingBox:
+            continue
+        entity = annotation.entity
+        color = palette.get(entity)
+        if color is None:
+            color = default_color
+            if entity is not None and entity.color is not None:
+                color = f'#{entity.color}'
+            palette[entity] = color
+        bboxes.append(box)
+        colors.append(color)
+    return BoundingBoxArray.from_bboxes(bboxes), colors
+
+
+def draw_bounding_boxes(image: Image, annotations, colors=None):
     """
     Draw bounding boxes on an image
 
     :param image: Image to annotate
-    :param annotations: A list of BoundingBox objects
-    :param color: The color of the bounding box
+    :param annotations: A list of annotations or a BoundingBoxArray
+    :param colors: A color or a list of colors when passing a BoundingBoxArray
     :return: The annotated image
     """
+    if isinstance(annotations, BoundingBoxArray):
+        boxes = annotations
+        if colors is None or type(colors) == str:
+            colors = [colors or 'red'] * len(boxes)
+    else:
+        boxes, colors = annotation_boxes(annotations)
     draw = ImageDraw.Draw(image)
-    for annotation in annotations:
-        box = annotation.target.selectors[0]
-        color = 'red'
-        if annotation.entity.color is not None:
-            color = f'#{annotation.entity.color}'
-        draw.polygon([
-            box.vertices[0].x, box.vertices[0].y,
-            box.vertices[1].x, box.vertices[1].y,
-            box.vertices[2].x, box.vertices[2].y,
-            box.vertices[3].x, box.vertices[3].y],
-            None,
-            color
-        )
+    polygons = boxes.vertices.reshape(len(boxes), 8).tolist()
+    for polygon, color in zip(polygons, colors):
+        draw.polygon(polygon, None, color)
     return image
 
 
+def _render_page(image_path, coords, colors, output_path):
+    with Image.open(image_path) as image:
+        image = draw_bounding_boxes(
+            image.convert('RGB'), BoundingBoxArray(coords), colors)
+        image.save(output_path, format='PNG')
+    return output_path
+
+
+def render_pages(pages: Iterable, output_dir: str, max_workers: int = None):
+    """
+    Draw the bounding boxes of many pages in a process pool and save them as
+    PNG files.
+
+    Parameters
+    ----------
+    pages: Iterable[Tuple[str, Union[List, BoundingBoxArray]]]
+        `(image_path, annotations)` pairs, where `annotations` is a list of
+        annotations or a `BoundingBoxArray`
+    output_dir: str
+        The directory where `<image name>.png` files are written. Images
+        sharing a name get `<image name>-<i>.png` files instead, `i` counting
+        from 1 in the order of `pages`.
+    max_workers: int
+        The number of processes, defaults to the number of CPUs
+
+    Return
+    ------
+    An iterator over the paths of the written files, in the order of `pages`
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    max_workers = max_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        window = 2 * max_workers
+        pending = deque()
+        names = set()
+        for image_path, annotations in pages:
+            if isinstance(annotations, BoundingBoxArray):
+                boxes, colors = annotations, ['red'] * len(annotations)
+            else:
+                boxes, colors = annotation_boxes(annotations)
+            stem = os.path.splitext(os.path.basename(image_path))[0]
+            name, i = stem, 0
+            while name in names:
+                i += 1
+                name = f'{stem}-{i}'
+            names.add(name)
+            output_path = os.path.join(output_dir, f'{name}.png')
+            pending.append(executor.submit(
+                _render_page, image_path, boxes.coords, colors, output_path))
+            # bound the number of pages held in memory
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
 if __name__ == '__main__':
     a = BoundingBox(left=0, right=4, top=0, bottom=4)
     b = BoundingBox.fromVertex(Vertex(2, 3), height=1, width=1)
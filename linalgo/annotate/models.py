@@ -1,10 +1,13 @@
 import copy
 
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime
 from typing import Dict, Iterable, List, Union
 import json
 import logging
 import uuid
+import weakref
 
 from linalgo.annotate.bbox import BoundingBox, Vertex
 
@@ -14,6 +17,8 @@ Selector = Union[BoundingBox]
 
 class SelectorFactory:
 
+    __slots__ = ()
+
     @staticmethod
     def factory(d: Dict):
         if 'x' in d:
@@ -32,6 +37,9 @@ class SelectorFactory:
 
 class XPathSelector:
 
+    __slots__ = ('start_container', 'end_container', 'start_offset',
+                 'end_offset')
+
     def __init__(self, start_container: str, end_container: str,
                  start_offset: int, end_offset: int):
         self.start_container = start_container
@@ -42,9 +50,13 @@ class XPathSelector:
 
 class TargetFactory:
 
+    __slots__ = ()
+
     @staticmethod
     def factory(data):
-        if str(type(data)) == str(Target):
+        if data is None:
+            return None
+        elif str(type(data)) == str(Target):
             return data
         elif type(data) == str:
             d = json.loads(data.replace("\'", "\""))
@@ -62,9 +74,41 @@ class TargetFactory:
             selectors=[SelectorFactory.factory(s) for s in d['selector']]
         )
 
+    @staticmethod
+    def from_records(data: List) -> List['Target']:
+        """
+        Batch equivalent of `factory`. Targets serialized as strings are
+        decoded with a single json parse.
+        """
+        strings = [d for d in data if type(d) == str]
+        try:
+            decoded = iter(json.loads(
+                '[' + ','.join(strings).replace("\'", "\"") + ']'))
+        except ValueError:
+            # locate the malformed target
+            decoded = iter([json.loads(d.replace("\'", "\"")) for d in strings])
+        sources = {}
+        targets = []
+        for d in data:
+            if type(d) == str:
+                d = next(decoded)
+            if type(d) != dict or d == {}:
+                targets.append(TargetFactory.factory(d))
+                continue
+            source = d['source']
+            if source not in sources:
+                sources[source] = Document.factory(source)
+            targets.append(Target(
+                source=sources[source],
+                selectors=[SelectorFactory.factory(s) for s in d['selector']]
+            ))
+        return targets
+
 
 class Target(TargetFactory):
 
+    __slots__ = ('source', 'selectors')
+
     def __init__(self, source: 'Document' = None,
                  selectors: Iterable[Selector] = []):
         self.source = source
@@ -76,23 +120,103 @@ class Target(TargetFactory):
             selectors=[copy.deepcopy(s) for s in self.selectors])
 
 
+class Registry:
+    """
+    Maps the ids of model objects to the objects themselves, per model class.
+
+    Models are registered in the current registry, which is the global
+    default one unless another registry has been activated. Used as a context
+    manager, a registry is a scope: objects created inside the `with` block
+    are isolated from the rest of the program and released when it exits.
+
+    >>> with Registry() as registry:
+    ...     task = client.get_task(task_id)
+
+    Parameters
+    ----------
+    weak: bool
+        Only hold weak references, so that objects no longer referenced
+        elsewhere can be garbage collected
+    """
+
+    def __init__(self, weak: bool = False):
+        self.weak = weak
+        self._stores = {}
+        self._tokens = []
+
+    def __len__(self):
+        return sum(len(store) for store in self._stores.values())
+
+    def __repr__(self):
+        return f'Registry::{len(self)} objects'
+
+    def store(self, cls):
+        """The id to object mapping of the `cls` model."""
+        store = self._stores.get(cls)
+        if store is None:
+            store = weakref.WeakValueDictionary() if self.weak else dict()
+            self._stores[cls] = store
+        return store
+
+    @contextmanager
+    def activate(self):
+        """Make this registry the current one inside a `with` block."""
+        token = _current_registry.set(self)
+        try:
+            yield self
+        finally:
+            _current_registry.reset(token)
+
+    def clear(self):
+        """Release all the registered objects."""
+        self._stores.clear()
+
+    def __enter__(self):
+        self._tokens.append(_current_registry.set(self))
+        return self
+
+    def __exit__(self, *args):
+        _current_registry.reset(self._tokens.pop())
+        self.clear()
+
+
+_default_registry = Registry()
+_current_registry = ContextVar('registry', default=_default_registry)
+
+
+def current_registry() -> Registry:
+    return _current_registry.get()
+
+
+class _RegistryDescriptor:
+
+    def __get__(self, obj, owner):
+        return _current_registry.get().store(owner)
+
+
 class RegistryMixin:
 
+    __slots__ = ('__weakref__',)
+
+    # the objects of the class in the current registry
+    _registry = _RegistryDescriptor()
+
     def __new__(cls, *args, **kwargs):
-        unique_id = kwargs.get('unique_id', uuid.uuid4().hex)
-        # unique_id = uuid.UUID(unique_id).hex
-        if not hasattr(cls, '_registry'):
-            cls._registry = dict()
-        if unique_id in cls._registry:
-            return cls._registry[unique_id]
-        else:
+        unique_id = kwargs.get('unique_id')
+        if unique_id is None:
+            unique_id = uuid.uuid4().hex
+        obj = cls._registry.get(unique_id)
+        if obj is None:
             obj = super().__new__(cls)
             obj.id = unique_id
-            return obj
+        return obj
 
     def register(self):
         self._registry[self.id] = self
 
+    def unregister(self):
+        self._registry.pop(self.id, None)
+
     def setattr(self, name, value):
         if not hasattr(self, name):
             self.__setattr__(name, value)
@@ -110,6 +234,8 @@ class RegistryMixin:
 
 class FromIdFactoryMixin:
 
+    __slots__ = ()
+
     @classmethod
     def factory(cls, arg):
         if arg is None:
@@ -122,8 +248,88 @@ class FromIdFactoryMixin:
             raise Exception(f'No factory method found for type {type(arg)}')
 
 
+class AnnotationList(list):
+    """
+    A list of annotations with secondary indexes by task, annotator and
+    entity.
+
+    Indexes are built on the first lookup and kept up to date on `append`.
+    Any other mutation of the list drops them. Call `invalidate` after
+    changing the task, annotator or entity of an annotation in place.
+    """
+
+    __slots__ = ('_members', '_indexes')
+
+    keys = ('task', 'annotator', 'entity')
+
+    def __init__(self, iterable=()):
+        super().__init__(iterable)
+        self._members = None
+        self._indexes = {}
+
+    def invalidate(self):
+        self._members = None
+        self._indexes = {}
+
+    def _index(self, key):
+        index = self._indexes.get(key)
+        if index is None:
+            index = {}
+            for a in self:
+                index.setdefault(getattr(a, key), []).append(a)
+            self._indexes[key] = index
+        return index
+
+    def __contains__(self, annotation):
+        if self._members is None:
+            self._members = set(self)
+        return annotation in self._members
+
+    def append(self, annotation):
+        super().append(annotation)
+        if self._members is not None:
+            self._members.add(annotation)
+        for key, index in self._indexes.items():
+            index.setdefault(getattr(annotation, key), []).append(annotation)
+
+    def by_task(self, task) -> List['Annotation']:
+        return list(self._index('task').get(task, []))
+
+    def by_annotator(self, annotator) -> List['Annotation']:
+        return list(self._index('annotator').get(annotator, []))
+
+    def by_entity(self, entity) -> List['Annotation']:
+        return list(self._index('entity').get(entity, []))
+
+    @property
+    def entities(self) -> List['Entity']:
+        return list(self._index('entity'))
+
+
+def _invalidating(name):
+    method = getattr(list, name)
+
+    def wrapper(self, *args, **kwargs):
+        self.invalidate()
+        return method(self, *args, **kwargs)
+    wrapper.__name__ = name
+    return wrapper
+
+
+for _name in ('extend', 'insert', 'remove', 'pop', 'clear', 'sort', 'reverse',
+              '__setitem__', '__delitem__', '__iadd__', '__imul__'):
+    setattr(AnnotationList, _name, _invalidating(_name))
+
+
+def _resolve(cls, ids: Iterable[str]) -> Dict:
+    """Map each distinct id to its registered `cls` object."""
+    return {i: cls.factory(i or None) for i in set(ids)}
+
+
 class AnnotationFactory:
 
+    __slots__ = ()
+
     @staticmethod
     def from_dict(d: Dict):
         return Annotation(
@@ -137,12 +343,60 @@ class AnnotationFactory:
             created=d['created']
         )
 
+    @staticmethod
+    def from_records(records: Iterable[Dict]) -> List['Annotation']:
+        """
+        Batch equivalent of `from_dict` for the rows of an export chunk.
+
+        Foreign keys are resolved once per distinct id, targets are decoded
+        with a single json parse and annotations that aren't registered yet
+        are filled in directly rather than through `__init__`.
+        """
+        records = list(records)
+        entities = _resolve(Entity, (r['entity'] for r in records))
+        annotators = _resolve(Annotator, (r['annotator'] for r in records))
+        documents = _resolve(Document, (r['document'] for r in records))
+        tasks = _resolve(Task, (r['task'] for r in records))
+        targets = Target.from_records([r['target'] for r in records])
+        registry = Annotation._registry
+        now = datetime.now()
+        annotations = []
+        for r, target in zip(records, targets):
+            annotation = registry.get(r['id'])
+            if annotation is not None:
+                annotation = Annotation(
+                    unique_id=r['id'], entity=entities[r['entity']],
+                    body=r['body'], annotator=annotators[r['annotator']],
+                    document=documents[r['document']], task=tasks[r['task']],
+                    target=target, created=r['created'])
+            else:
+                annotation = object.__new__(Annotation)
+                annotation.id = r['id']
+                annotation.entity = entities[r['entity']]
+                annotation.score = None
+                annotation.body = r['body']
+                annotation.task = tasks[r['task']]
+                annotation.annotator = annotators[r['annotator']]
+                annotation.document = documents[r['document']]
+                annotation.target = target
+                created = r['created']
+                annotation.created = now if created is None \
+                    else datetime.fromisoformat(created)
+                if annotation.document is not None:
+                    annotation.document.annotations.append(annotation)
+                registry[annotation.id] = annotation
+            annotations.append(annotation)
+        return annotations
+
 
 class Annotation(RegistryMixin, FromIdFactoryMixin, AnnotationFactory):
     """
     Annotation class compatible with the W3C annotation data model.
     """
 
+    __slots__ = ('id', 'entity', 'score', 'body', 'task', 'annotator',
+                 'document', 'target', 'created')
+
     def __init__(self, entity: 'Entity', document: 'Document', body: str = None,
                  annotator: 'Annotator' = None, task: 'Task' = None,
                  created=None, target: Target = None, score: float = None,
@@ -153,7 +407,12 @@ class Annotation(RegistryMixin, FromIdFactoryMixin, AnnotationFactory):
         self.setattr('task', Task.factory(task))
         self.setattr('annotator', Annotator.factory(annotator))
         self.setattr('document', Document.factory(document))
-        self.document.annotations.append(self)
+        annotations = self.document.annotations
+        if self in annotations:
+            # the indexed task, annotator or entity may have changed
+            annotations.invalidate()
+        else:
+            annotations.append(self)
         self.setattr('target', TargetFactory.factory(target))
         if created is None:
             created = datetime.now()
@@ -174,6 +433,8 @@ class Annotation(RegistryMixin, FromIdFactoryMixin, AnnotationFactory):
 
 class AnnotatorFactory:
 
+    __slots__ = ()
+
     @staticmethod
     def from_dict(js):
         return Annotator(
@@ -188,6 +449,9 @@ class Annotator(RegistryMixin, FromIdFactoryMixin, AnnotatorFactory):
     The Annotator class can create, delete or modify Annotations.
     """
 
+    __slots__ = ('id', 'name', 'task', 'model', 'type_id', 'threshold',
+                 'annotator_id', 'owner')
+
     def __init__(self, name: str = None, model=None, task: 'Task' = None,
                  annotation_type_id=None, threshold: float = 0, **kwargs):
         self.setattr('name', name)
@@ -229,6 +493,8 @@ class Annotator(RegistryMixin, FromIdFactoryMixin, AnnotatorFactory):
 
 class CorpusFactory:
 
+    __slots__ = ()
+
     @staticmethod
     def from_dict(d):
         return Corpus(
@@ -240,6 +506,8 @@ class CorpusFactory:
 
 class Corpus(RegistryMixin, FromIdFactoryMixin, CorpusFactory):
 
+    __slots__ = ('id', 'name', 'description', 'documents')
+
     def __init__(self, name: str = None, description: str = None,
                  documents: Iterable['Document'] = [], **kwargs):
         self.setattr('name', name)
@@ -254,21 +522,49 @@ class Corpus(RegistryMixin, FromIdFactoryMixin, CorpusFactory):
 
 class DocumentFactory:
 
+    __slots__ = ()
+
     @staticmethod
     def from_dict(d):
         return Document(
             unique_id=d['id'],
             uri=d['uri'],
             content=d['content'],
-            corpus=Corpus(d['corpus'])
+            corpus=Corpus.factory(d['corpus'])
         )
 
+    @staticmethod
+    def from_records(records: Iterable[Dict]) -> List['Document']:
+        """Batch equivalent of `from_dict` for the rows of an export chunk."""
+        records = list(records)
+        corpora = _resolve(Corpus, (r['corpus'] for r in records))
+        registry = Document._registry
+        documents = []
+        for r in records:
+            document = registry.get(r['id'])
+            if document is not None:
+                document = Document(
+                    unique_id=r['id'], uri=r['uri'], content=r['content'],
+                    corpus=corpora[r['corpus']])
+            else:
+                document = object.__new__(Document)
+                document.id = r['id']
+                document.uri = r['uri']
+                document.content = r['content']
+                document.corpus = corpora[r['corpus']]
+                document.annotations = []
+                registry[document.id] = document
+            documents.append(document)
+        return documents
+
 
 class Document(RegistryMixin, FromIdFactoryMixin, DocumentFactory):
     """
     Base class that holds the document on which to perform annotations.
     """
 
+    __slots__ = ('id', 'uri', 'content', 'corpus', '_annotations')
+
     def __init__(self, content: str = None, uri: str = None,
                  corpus: Corpus = None, **kwargs):
         self.setattr('uri', uri)
@@ -277,9 +573,17 @@ class Document(RegistryMixin, FromIdFactoryMixin, DocumentFactory):
         self.setattr('annotations', [])
         self.register()
 
+    @property
+    def annotations(self) -> AnnotationList:
+        return self._annotations
+
+    @annotations.setter
+    def annotations(self, annotations):
+        self._annotations = AnnotationList(annotations)
+
     @property
     def entities(self):
-        return list(set(a.entity for a in self.annotations))
+        return self._annotations.entities
 
     def __repr__(self):
         return f'Document::{self.id}'
@@ -287,6 +591,8 @@ class Document(RegistryMixin, FromIdFactoryMixin, DocumentFactory):
 
 class EntityFactory:
 
+    __slots__ = ()
+
     @staticmethod
     def from_dict(d: Dict):
         return Entity(
@@ -298,6 +604,8 @@ class EntityFactory:
 
 class Entity(RegistryMixin, FromIdFactoryMixin, EntityFactory):
 
+    __slots__ = ('id', 'name', 'color')
+
     def __init__(self, name: str = None, color: str = None, **kwargs):
         self.setattr('name', name)
         self.setattr('color', color)
@@ -308,6 +616,9 @@ class Entity(RegistryMixin, FromIdFactoryMixin, EntityFactory):
 
 
 class TaskFactory:
+
+    __slots__ = ()
+
     @staticmethod
     def from_dict(d):
         return Task(
@@ -326,6 +637,9 @@ class Task(RegistryMixin, FromIdFactoryMixin, TaskFactory):
     annotations.
     """
 
+    __slots__ = ('id', 'name', 'description', 'entities', 'corpora',
+                 'annotators', '_annotations', 'documents')
+
     def __init__(
             self, name: str = None, description: str = None,
             entities: List[Entity] = [], corpora: List[Corpus] = [],
@@ -343,8 +657,16 @@ class Task(RegistryMixin, FromIdFactoryMixin, TaskFactory):
     def __repr__(self):
         return f'Task::{str(self.id)}'
 
+    @property
+    def annotations(self) -> AnnotationList:
+        return self._annotations
+
+    @annotations.setter
+    def annotations(self, annotations):
+        self._annotations = AnnotationList(annotations)
+
     def add_annotation(self, annotation: Annotation):
-        self.annotations.add(annotation)
+        self.annotations.append(annotation)
 
     def add_document(self, document: Document):
-        self.documents.add(document)
+        self.documents.append(document)
@@ -1,24 +1,141 @@
+import numpy as np
+
+from linalgo.annotate import b_entity, p_entity, s_entity, w_entity
+from linalgo.annotate.bbox import GridIndex
+
+HIERARCHY = tuple(e.name for e in (b_entity, p_entity, w_entity, s_entity))
+
+
+class LayoutStore:
+    """
+    The content and layout blocks of a document, shared by every navigator
+    over it, with spatial indexes built on first use.
+    """
+
+    def __init__(self, content, layout):
+        self.content = content
+        self.layout = layout
+        self._content_index = None
+        self._layout_index = None
+
+    @property
+    def content_index(self) -> GridIndex:
+        if self._content_index is None:
+            self._content_index = GridIndex([c['bbox'] for c in self.content])
+        return self._content_index
+
+    @property
+    def layout_index(self) -> GridIndex:
+        if self._layout_index is None:
+            self._layout_index = GridIndex([l['bbox'] for l in self.layout])
+        return self._layout_index
+
+
 class LazyLayoutNavigator:
+    """
+    A view over the blocks of a layout that lie within a parent block.
 
-    def __init__(self, content, layout, exclude=[], threshold=0.0):
-        self._content = content
-        self._layout = layout
+    Navigators returned by `get` and `children` only hold their parent
+    block: the layout and content blocks they contain are looked up in the
+    shared `LayoutStore` when first accessed and memoized, so walking one
+    branch of the hierarchy only costs that branch.
+    """
+
+    def __init__(self, content, layout, exclude=[], threshold=0.0,
+                 hierarchy=HIERARCHY):
+        self._store = LayoutStore(content, layout)
         self.exclude = exclude
         self.threshold = threshold
+        self.hierarchy = hierarchy
+        self.block = None
+        self.parent = None
+        self._layout_ids = np.arange(len(layout))
+        self._content_ids = np.arange(len(content))
+        self._reset()
+
+    def _reset(self):
+        self._layout_blocks = None
+        self._content_blocks = None
+        self._children = {}
+        self._text = None
+
+    def _child(self, block):
+        child = LazyLayoutNavigator.__new__(LazyLayoutNavigator)
+        child._store = self._store
+        child.exclude = self.exclude
+        child.threshold = self.threshold
+        child.hierarchy = self.hierarchy
+        child.block = block
+        child.parent = self
+        child._layout_ids = None
+        child._content_ids = None
+        child._reset()
+        return child
+
+    def __repr__(self):
+        name = 'ROOT' if self.block is None else self.block['type']
+        return f'LazyLayoutNavigator::{name}'
+
+    @property
+    def layout_ids(self) -> np.ndarray:
+        if self._layout_ids is None:
+            bbox = self.block['bbox']
+            layout = self._store.layout
+            candidates = np.intersect1d(
+                self._store.layout_index.query(bbox),
+                self.parent.layout_ids, assume_unique=True)
+            self._layout_ids = np.array(
+                [i for i in candidates.tolist()
+                 if layout[i]['bbox'].overlap(bbox)], dtype=np.int64)
+        return self._layout_ids
+
+    @property
+    def content_ids(self) -> np.ndarray:
+        if self._content_ids is None:
+            bbox = self.block['bbox']
+            content = self._store.content
+            candidates = np.intersect1d(
+                self._store.content_index.query(bbox),
+                self.parent.content_ids, assume_unique=True)
+            self._content_ids = np.array(
+                [i for i in candidates.tolist()
+                 if content[i]['bbox'].overlap(bbox) > .6], dtype=np.int64)
+        return self._content_ids
+
+    @property
+    def _layout(self):
+        if self._layout_blocks is None:
+            layout = self._store.layout
+            self._layout_blocks = [layout[i] for i in self.layout_ids]
+        return self._layout_blocks
+
+    @property
+    def _content(self):
+        if self._content_blocks is None:
+            content = self._store.content
+            self._content_blocks = [content[i] for i in self.content_ids]
+        return self._content_blocks
 
     def content(self, separator=''):
-        content = []
-        for b in self._content:
-            if b['type'] == 'google' and b['type'] not in self.exclude:
-                content.append(b['text'])
-        return separator.join(content)
+        if self._text is None:
+            self._text = [b['text'] for b in self._content
+                          if b['type'] == 'google' and
+                          b['type'] not in self.exclude]
+        return separator.join(self._text)
 
     def get(self, name: str):
-        parents = [p for p in self._layout if p['type'] == name]
-        navigators = []
-        for p in parents:
-            ll = [l for l in self._layout if l['bbox'].overlap(p['bbox'])]
-            cc = [c for c in self._content if c['bbox'].overlap(p['bbox']) > .6]
-            n = LazyLayoutNavigator(cc, ll, exclude=self.exclude)
-            navigators.append(n)
-        return navigators
+        navigators = self._children.get(name)
+        if navigators is None:
+            navigators = [self._child(p) for p in self._layout
+                          if p['type'] == name]
+            self._children[name] = navigators
+        return list(navigators)
+
+    def children(self):
+        """Navigators over the blocks of the next level of the hierarchy."""
+        if self.block is None:
+            return self.get(self.hierarchy[0])
+        name = self.block['type']
+        if name not in self.hierarchy[:-1]:
+            return []
+        return self.get(self.hierarchy[self.hierarchy.index(name) + 1])
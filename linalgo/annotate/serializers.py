@@ -16,33 +16,49 @@ class Serializer:
 class BoundingBoxSerializer(Serializer):
 
     @staticmethod
-    def _serializer(instance):
+    def _serialize(instance):
         s = {
-            'vertex': instance.vertex,
+            'x': instance.left,
+            'y': instance.top,
             'height': instance.height,
             'width': instance.width
         }
         return s
 
 
+class XPathSelectorSerializer(Serializer):
+
+    @staticmethod
+    def _serialize(instance):
+        s = {
+            'startContainer': instance.start_container,
+            'endContainer': instance.end_container,
+            'startOffset': instance.start_offset,
+            'endOffset': instance.end_offset
+        }
+        return s
+
+
 class SelectorSerializerFactory:
 
     @staticmethod
     def create(instance):
         if type(instance) == BoundingBox:
             return BoundingBoxSerializer(instance)
-        else:
-            return {}
+        return XPathSelectorSerializer(instance)
 
 
 class TargetSerializer(Serializer):
 
     @staticmethod
     def _serialize(target):
-        selector_serializer = SelectorSerializerFactory(target.selectors)
+        source = None
+        if target.source is not None:
+            source = target.source.id
         s = {
-            'source': target.source,
-            'selectors': selector_serializer.serialize()
+            'source': source,
+            'selector': [SelectorSerializerFactory.create(s).serialize()
+                         for s in target.selectors]
         }
         return s
 
@@ -54,17 +70,25 @@ class AnnotationSerializer(Serializer):
         annotator_id = None
         if instance.annotator is not None:
             annotator_id = instance.annotator.id
+        task_id = None
+        if instance.task is not None:
+            task_id = instance.task.id
         target = None
         if instance.target is not None:
             target_serializer = TargetSerializer(instance.target)
             target = target_serializer.serialize()
+        created = getattr(instance, 'created', None)
+        if created is not None:
+            created = created.isoformat()
         s = {
+            'id': instance.id,
             'entity': instance.entity.id,
             'body': instance.body,
             'annotator': annotator_id,
             'document': instance.document.id,
-            'created': getattr(instance, 'created', lambda: None),
+            'task': task_id,
+            'created': created,
             'target': target,
-            'score': getattr(instance, 'score', lambda: None)
+            'score': getattr(instance, 'score', None)
         }
-        return s
\ No newline at end of file
+        return s
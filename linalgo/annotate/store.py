@@ -0,0 +1,382 @@
+import json
+from datetime import timezone
+from typing import Dict, Iterable, List
+
+import numpy as np
+import pandas as pd
+
+from linalgo.annotate.models import Annotation, XPathSelector
+
+NAT = np.iinfo(np.int64).min
+
+
+class Interner:
+    """
+    Bidirectional mapping between hashable values and dense integer codes.
+    """
+
+    def __init__(self, values: Iterable = ()):
+        self.values = []
+        self.index = {}
+        for v in values:
+            self.add(v)
+
+    def __len__(self):
+        return len(self.values)
+
+    def add(self, value):
+        code = self.index.get(value)
+        if code is None:
+            code = len(self.values)
+            self.index[value] = code
+            self.values.append(value)
+        return code
+
+    def encode(self, values: Iterable) -> np.ndarray:
+        """
+        Codes of `values`, interning the ones never seen before. Missing
+        values (`None` or NaN) are not interned and get -1.
+        """
+        values = pd.Series(list(values) if not hasattr(values, '__len__')
+                           else values, dtype=object)
+        codes, _ = pd.factorize(values)
+        present = np.flatnonzero(codes >= 0)
+        if len(present) == 0:
+            return np.full(len(values), -1, dtype=np.int32)
+        # intern each distinct value once, in order of first appearance
+        _, first = np.unique(codes[present], return_index=True)
+        uniques = values.to_numpy()[present[first]].tolist()
+        if len(self.values):
+            unique_codes = self.lookup(uniques)
+        else:
+            unique_codes = np.full(len(uniques), -1, dtype=np.int32)
+        new = np.flatnonzero(unique_codes < 0)
+        if len(new):
+            start = len(self.values)
+            new_values = [uniques[i] for i in new.tolist()]
+            self.index.update(zip(new_values, range(start, start + len(new))))
+            self.values.extend(new_values)
+            unique_codes[new] = np.arange(start, start + len(new))
+        return np.where(codes >= 0, unique_codes[codes], -1).astype(np.int32)
+
+    def lookup(self, values: Iterable) -> np.ndarray:
+        """Codes of `values`, -1 for the ones never seen before."""
+        get = self.index.get
+        return np.fromiter((get(v, -1) for v in values), dtype=np.int32)
+
+    def decode(self, codes: np.ndarray) -> List:
+        values = self.values
+        return [values[c] if c >= 0 else None for c in codes]
+
+
+def parse_timestamps(values: Iterable[str]) -> np.ndarray:
+    """Parse ISO 8601 strings to UTC nanoseconds since the epoch."""
+    ts = pd.to_datetime(pd.Series(values, dtype=object), utc=True,
+                        format='ISO8601')
+    return ts.to_numpy(dtype='datetime64[ns]').view(np.int64)
+
+
+def _timestamp(created):
+    if created is None:
+        return NAT
+    if created.tzinfo is None:
+        created = created.astimezone()
+    created = created.astimezone(timezone.utc).replace(tzinfo=None)
+    return np.datetime64(created, 'ns').view(np.int64)
+
+
+def _offsets(target):
+    if target is None or len(target.selectors) == 0:
+        return -1, -1
+    selector = target.selectors[0]
+    if type(selector) == XPathSelector:
+        return selector.start_offset, selector.end_offset
+    return -1, -1
+
+
+class AnnotationStore:
+    """
+    Columnar storage of annotations backed by NumPy arrays.
+
+    Entities, annotators, documents and tasks are interned into integer
+    codes shared by every store derived from the same `vocab`, so that
+    filters and group-bys run as vectorized array operations. Annotation ids,
+    bodies and targets are kept as object columns to convert back to
+    `Annotation` objects.
+
+    Columns
+    -------
+    entity, annotator, document, task: int32
+        Interned codes, -1 when missing
+    score: float64
+        NaN when missing
+    created: int64
+        UTC nanoseconds since the epoch
+    start, end: int64
+        Offsets of the first text selector, -1 when missing
+    """
+
+    keys = ('entity', 'annotator', 'document', 'task')
+    columns = keys + ('score', 'created', 'start', 'end')
+
+    def __init__(self, ids, body, target, vocab: Dict[str, Interner] = None,
+                 **columns):
+        self.ids = np.asarray(ids, dtype=object)
+        self.body = np.asarray(body, dtype=object)
+        self.target = np.asarray(target, dtype=object)
+        if vocab is None:
+            vocab = {k: Interner() for k in self.keys}
+        self.vocab = vocab
+        n = len(self.ids)
+        dtypes = {'score': np.float64, 'created': np.int64, 'start': np.int64,
+                  'end': np.int64}
+        for name in self.columns:
+            column = columns.get(name)
+            dtype = dtypes.get(name, np.int32)
+            if column is None:
+                column = np.full(n, np.nan if name == 'score' else -1, dtype)
+            setattr(self, name, np.asarray(column, dtype=dtype))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __repr__(self):
+        return f'AnnotationStore::{len(self)} annotations'
+
+    def __getitem__(self, idx):
+        """Select rows with an integer index or a boolean mask."""
+        columns = {name: getattr(self, name)[idx] for name in self.columns}
+        return AnnotationStore(self.ids[idx], self.body[idx], self.target[idx],
+                               vocab=self.vocab, **columns)
+
+    @classmethod
+    def from_annotations(cls, annotations: Iterable[Annotation],
+                         vocab: Dict[str, Interner] = None):
+        annotations = list(annotations)
+        if vocab is None:
+            vocab = {k: Interner() for k in cls.keys}
+
+        def ids(name):
+            objs = (getattr(a, name) for a in annotations)
+            return vocab[name].encode(o.id if o is not None else None
+                                      for o in objs)
+        offsets = np.array([_offsets(a.target) for a in annotations],
+                           dtype=np.int64).reshape(-1, 2)
+        score = [a.score for a in annotations]
+        return cls(
+            ids=[a.id for a in annotations],
+            body=[a.body for a in annotations],
+            target=[a.target for a in annotations],
+            vocab=vocab,
+            entity=ids('entity'),
+            annotator=ids('annotator'),
+            document=ids('document'),
+            task=ids('task'),
+            score=np.array(score, dtype=np.float64),
+            created=np.fromiter((_timestamp(a.created) for a in annotations),
+                                dtype=np.int64, count=len(annotations)),
+            start=offsets[:, 0],
+            end=offsets[:, 1]
+        )
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict],
+                     vocab: Dict[str, Interner] = None):
+        """
+        Build a store from export rows without creating model objects.
+
+        Targets are kept as the raw strings of the export and only parsed
+        when converting back to annotations.
+        """
+        df = pd.DataFrame.from_records(records)
+        if vocab is None:
+            vocab = {k: Interner() for k in cls.keys}
+        n = len(df)
+
+        def column(name, default=None):
+            if name in df:
+                return df[name].tolist()
+            return [default] * n
+        score = pd.to_numeric(pd.Series(column('score'), dtype=object),
+                              errors='coerce').to_numpy(dtype=np.float64)
+        targets = column('target')
+        start, end = np.full(n, -1, np.int64), np.full(n, -1, np.int64)
+        for i, t in enumerate(targets):
+            if type(t) == str and 'startOffset' in t:
+                selector = json.loads(t.replace("'", '"'))['selector'][0]
+                start[i] = selector['startOffset']
+                end[i] = selector['endOffset']
+        return cls(
+            ids=column('id'),
+            body=column('body'),
+            target=targets,
+            vocab=vocab,
+            score=score,
+            created=parse_timestamps(column('created')),
+            start=start,
+            end=end,
+            **{k: vocab[k].encode(column(k)) for k in cls.keys}
+        )
+
+    def to_annotations(self) -> List[Annotation]:
+        """Create or update the `Annotation` objects of the store."""
+        decoded = {k: self.vocab[k].decode(getattr(self, k))
+                   for k in self.keys}
+        created = pd.to_datetime(self.created, utc=True)
+        annotations = []
+        for i in range(len(self)):
+            annotations.append(Annotation(
+                unique_id=self.ids[i],
+                entity=decoded['entity'][i],
+                document=decoded['document'][i],
+                annotator=decoded['annotator'][i],
+                task=decoded['task'][i],
+                body=self.body[i],
+                score=None if np.isnan(self.score[i]) else self.score[i],
+                target=self.target[i],
+                created=None if self.created[i] == NAT
+                else created[i].isoformat()
+            ))
+        return annotations
+
+    def codes(self, name, values) -> np.ndarray:
+        """Codes of ids or model objects in the `name` vocabulary."""
+        if isinstance(values, (str, type(None))) or hasattr(values, 'id'):
+            values = [values]
+        values = [getattr(v, 'id', v) for v in values]
+        return self.vocab[name].lookup(values)
+
+    def mask(self, **filters) -> np.ndarray:
+        """
+        Boolean mask of the rows matching all `filters`.
+
+        Keys are column names. Values of `entity`, `annotator`, `document`
+        and `task` can be ids, model objects or collections of them. The
+        `created_after` and `created_before` filters take nanosecond
+        timestamps or datetimes.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for name, value in filters.items():
+            if name in self.keys:
+                mask &= np.isin(getattr(self, name), self.codes(name, value))
+            elif name == 'created_after':
+                mask &= self.created >= self._ns(value)
+            elif name == 'created_before':
+                mask &= self.created < self._ns(value)
+            elif name in self.columns:
+                mask &= getattr(self, name) == value
+            else:
+                raise KeyError(f'{name} is not a column.')
+        return mask
+
+    @staticmethod
+    def _ns(value):
+        if hasattr(value, 'tzinfo'):
+            return _timestamp(value)
+        return value
+
+    def filter(self, **filters) -> 'AnnotationStore':
+        return self[self.mask(**filters)]
+
+    def group_keys(self, by) -> np.ndarray:
+        """Combine the `by` columns into a single int64 group key."""
+        if type(by) == str:
+            by = (by,)
+        columns = [getattr(self, name).astype(np.int64) + 1 for name in by]
+        dims = [len(self.vocab[name]) + 1 for name in by]
+        if len(columns) == 1:
+            return columns[0]
+        return np.ravel_multi_index(columns, dims)
+
+    def groupby_count(self, by):
+        """
+        Count the rows of each group.
+
+        Return
+        ------
+        A tuple `(keys, counts)` where `keys` maps each `by` column to the
+        codes of every group.
+        """
+        if type(by) == str:
+            by = (by,)
+        groups, counts = np.unique(self.group_keys(by), return_counts=True)
+        dims = [len(self.vocab[name]) + 1 for name in by]
+        codes = np.unravel_index(groups, dims) if len(by) > 1 else [groups]
+        return {name: c - 1 for name, c in zip(by, codes)}, counts
+
+    def latest(self, by=('document',)) -> 'AnnotationStore':
+        """Keep the most recent annotation of each `by` group."""
+        keys = self.group_keys(by)
+        order = np.lexsort((self.created, keys))
+        keys = keys[order]
+        last = np.ones(len(keys), dtype=bool)
+        last[:-1] = keys[1:] != keys[:-1]
+        return self[order[last]]
+
+    def vote(self, by='document', weights: Dict[str, float] = None,
+             tie_break='latest'):
+        """
+        Majority vote of the annotators on the entity of each `by` group.
+
+        The latest annotation of each annotator in a group is its vote.
+        Votes are weighted by `weights`. Ties go to the entity with the
+        most recent vote (`tie_break='latest'`) or to the one chosen by the
+        highest weighted annotator (`tie_break='weight'`), then to the most
+        recent vote.
+
+        Parameters
+        ----------
+        by: str
+            The column to group by
+        weights: Dict[str, float]
+            Annotator ids mapped to the weight of their votes, 1 by default
+        tie_break: str
+            'latest' or 'weight'
+
+        Return
+        ------
+        A tuple `(winners, agreement)` of a store holding the latest vote
+        for the winning entity of each group, and the share of the total
+        weight of the group this entity received. Annotations without an
+        entity don't vote.
+        """
+        if tie_break not in ('latest', 'weight'):
+            raise ValueError(f'{tie_break} is not a valid tie break.')
+        votes = self[self.entity >= 0].latest(by=(by, 'annotator'))
+        annotator_weights = np.ones(len(self.vocab['annotator']) + 1)
+        for annotator, weight in (weights or {}).items():
+            code = self.vocab['annotator'].index.get(annotator)
+            if code is not None:
+                annotator_weights[code + 1] = weight
+        w = annotator_weights[votes.annotator + 1]
+        pairs, inverse = np.unique(votes.group_keys((by, 'entity')),
+                                   return_inverse=True)
+        score = np.bincount(inverse, weights=w, minlength=len(pairs))
+        max_weight = np.full(len(pairs), -np.inf)
+        np.maximum.at(max_weight, inverse, w)
+        # the most recent vote of each (group, entity) pair represents it
+        order = np.lexsort((votes.created, inverse))
+        last = np.ones(len(order), dtype=bool)
+        last[:-1] = inverse[order][1:] != inverse[order][:-1]
+        rep = order[last]
+        recent = votes.created[rep]
+        groups = getattr(votes, by)[rep].astype(np.int64)
+        if tie_break == 'latest':
+            keys = (recent, score, groups)
+        else:
+            keys = (recent, max_weight, score, groups)
+        order = np.lexsort(keys)
+        last = np.ones(len(order), dtype=bool)
+        last[:-1] = groups[order][1:] != groups[order][:-1]
+        winners = order[last]
+        _, group_index = np.unique(groups, return_inverse=True)
+        total = np.bincount(group_index, weights=score)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            agreement = score[winners] / total[group_index[winners]]
+        return votes[rep[winners]], agreement
+
+    def decode(self, name, codes=None) -> List:
+        """Ids of the `name` column, or of the given codes."""
+        if codes is None:
+            codes = getattr(self, name)
+        return self.vocab[name].decode(codes)
@@ -0,0 +1,122 @@
+import os
+import random
+import tempfile
+import unittest
+
+import numpy as np
+from PIL import Image
+
+from linalgo.annotate.bbox import BoundingBox, BoundingBoxArray, Vertex, \
+    draw_bounding_boxes, render_pages
+from linalgo.annotate.models import Annotation, Entity, Registry, Target
+from linalgo.annotate.serializers import BoundingBoxSerializer
+
+
+def random_bboxes(n, rng):
+    bboxes = []
+    for _ in range(n):
+        x, y = rng.randint(0, 50), rng.randint(0, 50)
+        bboxes.append(BoundingBox.fromVertex(
+            Vertex(x, y), height=rng.randint(-20, 20),
+            width=rng.randint(-20, 20)))
+    return bboxes
+
+
+class TestBoundingBoxArray(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(0)
+        self.a = random_bboxes(30, rng)
+        self.b = random_bboxes(20, rng)
+        self.array = BoundingBoxArray.from_bboxes(self.a)
+        self.other = BoundingBoxArray.from_bboxes(self.b)
+
+    def test_matches_scalar(self):
+        for name in ('contains', 'intersects', 'overlap'):
+            expected = [[getattr(a, name)(b) for b in self.b] for a in self.a]
+            np.testing.assert_allclose(
+                getattr(self.array, name)(self.other), expected)
+            np.testing.assert_allclose(
+                getattr(self.array, name)(self.b[0]),
+                [row[0] for row in expected])
+        np.testing.assert_allclose(
+            self.array.intersection(self.other),
+            [[a.intersection(b).area for b in self.b] for a in self.a])
+        np.testing.assert_allclose(self.array.area, [a.area for a in self.a])
+
+    def test_iou(self):
+        iou = self.array.iou(self.other)
+        self.assertEqual(iou.shape, (30, 20))
+        self.assertTrue(np.all((iou >= 0) & (iou <= 1)))
+        np.testing.assert_allclose(np.diag(self.array.iou(self.array))[
+            self.array.area > 0], 1)
+        np.testing.assert_allclose(self.array.iou(self.b[0]), iou[:, 0])
+
+    def test_conversions(self):
+        selectors = BoundingBoxSerializer(self.a).serialize()
+        array = BoundingBoxArray.from_selectors(selectors)
+        np.testing.assert_array_equal(array.coords, self.array.coords)
+        self.assertEqual(array.to_selectors(), selectors)
+        self.assertEqual(
+            [(b.left, b.top, b.right, b.bottom) for b in array.to_bboxes()],
+            [(b.left, b.top, b.right, b.bottom) for b in self.a])
+        self.assertEqual(array[0].area, self.a[0].area)
+        self.assertEqual(len(array[array.area > 0]),
+                         sum(b.area > 0 for b in self.a))
+        np.testing.assert_array_equal(
+            array.vertices[3],
+            [(v.x, v.y) for v in self.a[3].vertices])
+
+
+class TestRendering(unittest.TestCase):
+
+    def setUp(self):
+        with Registry():
+            entity = Entity(name='word', color='00ff00')
+            self.annotations = [
+                Annotation(entity=entity, document='page', target=Target(
+                    selectors=[BoundingBox(left=2 + i, right=8 + i, top=2,
+                                           bottom=8)]))
+                for i in range(0, 12, 6)]
+
+    def test_draw_bounding_boxes(self):
+        image = draw_bounding_boxes(Image.new('RGB', (20, 20)),
+                                    self.annotations)
+        self.assertEqual(image.getpixel((2, 2)), (0, 255, 0))
+        self.assertEqual(image.getpixel((14, 8)), (0, 255, 0))
+        self.assertEqual(image.getpixel((5, 5)), (0, 0, 0))
+        boxes = BoundingBoxArray.from_bboxes(
+            [a.target.selectors[0] for a in self.annotations])
+        expected = draw_bounding_boxes(Image.new('RGB', (20, 20)), boxes,
+                                       '#00ff00')
+        self.assertEqual(image.tobytes(), expected.tobytes())
+
+    def test_render_pages(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            pages = []
+            for i in range(3):
+                path = os.path.join(tmp, f'page-{i}.jpg')
+                Image.new('RGB', (20, 20), 'white').save(path)
+                pages.append((path, self.annotations))
+            output = os.path.join(tmp, 'out')
+            paths = list(render_pages(pages, output, max_workers=2))
+            self.assertEqual(
+                paths, [os.path.join(output, f'page-{i}.png')
+                        for i in range(3)])
+            with Image.open(paths[0]) as image:
+                self.assertEqual(image.getpixel((2, 2)), (0, 255, 0))
+            # pages with the same name in different directories
+            os.makedirs(os.path.join(tmp, 'other'))
+            path = os.path.join(tmp, 'other', 'page-0.jpg')
+            Image.new('RGB', (20, 20), 'black').save(path)
+            paths = list(render_pages(
+                pages[:1] + [(path, []), pages[0]], output, max_workers=2))
+            self.assertEqual(
+                paths, [os.path.join(output, f'page-0{suffix}.png')
+                        for suffix in ('', '-1', '-2')])
+            with Image.open(paths[1]) as image:
+                self.assertEqual(image.getpixel((10, 10)), (0, 0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
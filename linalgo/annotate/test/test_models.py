@@ -1,9 +1,21 @@
+import gc
 import unittest
+import uuid
 
-from linalgo.annotate.models import Annotation, Document
+from linalgo.annotate.models import Annotation, Document, Registry, Task, \
+    current_registry
 from .fixtures import ANNOTATIONS, DOCUMENTS
 
 
+def load_task(n_annotations=100):
+    task = Task(unique_id=ANNOTATIONS[0]['task'])
+    for i in range(n_annotations):
+        task.annotations.append(Annotation.from_dict(
+            {**ANNOTATIONS[0], 'id': uuid.uuid4().hex,
+             'document': f'doc-{i % 10}'}))
+    return task
+
+
 class TestModels(unittest.TestCase):
 
     def test_unique_id_mixin(self):
@@ -43,6 +55,103 @@ class TestModels(unittest.TestCase):
         anno = Annotation.from_dict(anno_fixture)
         self.assertEqual(doc, anno.document)
 
+    def test_slots(self):
+        anno = Annotation.from_dict(ANNOTATIONS[0])
+        for obj in (anno, anno.document, anno.entity, anno.annotator,
+                    anno.task, anno.target, anno.target.selectors[0]):
+            self.assertFalse(hasattr(obj, '__dict__'))
+
+    def test_annotations_from_records(self):
+        rows = [{**ANNOTATIONS[0], 'id': f'records-{i}',
+                 'target': str(ANNOTATIONS[0]['target'])} for i in range(3)]
+        with Registry():
+            expected = [Annotation.from_dict(row) for row in rows]
+            expected = [(a.id, a.entity.id, a.document.id, a.task.id,
+                         a.created, a.target.source.id,
+                         a.target.selectors[0].width) for a in expected]
+        with Registry():
+            existing = Annotation.from_dict(rows[0])
+            annotations = Annotation.from_records(rows)
+            self.assertIs(annotations[0], existing)
+            self.assertEqual(
+                expected,
+                [(a.id, a.entity.id, a.document.id, a.task.id, a.created,
+                  a.target.source.id, a.target.selectors[0].width)
+                 for a in annotations])
+            document = annotations[0].document
+            self.assertEqual(document.annotations, annotations)
+            self.assertIs(annotations[1].target.source, document)
+
+    def test_documents_from_records(self):
+        with Registry():
+            docs = Document.from_records(DOCUMENTS)
+            self.assertIs(Document(unique_id=DOCUMENTS[0]['id']), docs[0])
+            self.assertEqual(docs[0].corpus.id, DOCUMENTS[0]['corpus'])
+            self.assertEqual(docs[0].content, DOCUMENTS[0]['content'])
+
+    def test_document_indexes(self):
+        with Registry():
+            task = load_task(20)
+            doc = Document(unique_id='doc-0')
+            self.assertEqual(len(doc.annotations), 2)
+            self.assertEqual(doc.annotations.by_task(task), doc.annotations)
+            self.assertEqual(doc.entities, [doc.annotations[0].entity])
+            a = doc.annotations[0]
+            Annotation(unique_id=a.id, entity='other-entity', document=doc)
+            self.assertEqual(len(doc.annotations), 2)
+            self.assertEqual(len(doc.annotations.by_entity(a.entity)), 1)
+            b = Annotation(entity='other-entity', document=doc,
+                           annotator=a.annotator)
+            self.assertIn(b, doc.annotations)
+            self.assertEqual(len(doc.annotations.by_entity(b.entity)), 2)
+            self.assertEqual(
+                len(doc.annotations.by_annotator(a.annotator)), 3)
+            doc.annotations.remove(b)
+            self.assertNotIn(b, doc.annotations)
+            self.assertEqual(len(doc.annotations.by_entity(b.entity)), 1)
+            self.assertEqual(len(task.annotations.by_entity(b.entity)), 1)
+
+
+class TestRegistry(unittest.TestCase):
+
+    def test_scope(self):
+        outer = Annotation.from_dict(ANNOTATIONS[0])
+        with Registry() as registry:
+            self.assertIs(current_registry(), registry)
+            inner = Annotation.from_dict(ANNOTATIONS[0])
+            self.assertIsNot(inner, outer)
+            self.assertEqual(len(Annotation._registry), 1)
+            self.assertEqual(len(registry), 5)
+        self.assertEqual(len(registry), 0)
+        self.assertIs(Annotation.from_dict(ANNOTATIONS[0]), outer)
+
+    def test_activate(self):
+        registry = Registry()
+        with registry.activate():
+            task = load_task(10)
+        self.assertIsNot(Task(unique_id=task.id), task)
+        with registry.activate():
+            self.assertIs(Task(unique_id=task.id), task)
+        self.assertEqual(len(registry.store(Annotation)), 10)
+
+    def test_weak(self):
+        with Registry(weak=True) as registry:
+            task = load_task(10)
+            self.assertEqual(len(registry.store(Annotation)), 10)
+            del task
+            gc.collect()
+            self.assertEqual(len(registry.store(Annotation)), 0)
+
+    def test_flat_memory(self):
+        def load(n):
+            for _ in range(n):
+                with Registry():
+                    load_task(10)
+            gc.collect()
+            return len(gc.get_objects())
+        baseline = load(100)
+        self.assertLess(load(900) - baseline, 100)
+
 
 if __name__ == '__main__':
     unittest.main()
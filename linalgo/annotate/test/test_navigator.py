@@ -0,0 +1,76 @@
+import random
+import unittest
+
+from linalgo.annotate.bbox import BoundingBox, GridIndex
+from linalgo.annotate.navigator import LazyLayoutNavigator
+
+
+def random_blocks(n, kind, rng, size=40):
+    blocks = []
+    for i in range(n):
+        x, y = rng.randint(0, 200), rng.randint(0, 200)
+        bbox = BoundingBox(left=x, right=x + rng.randint(0, size), top=y,
+                           bottom=y + rng.randint(0, size))
+        blocks.append({'type': kind, 'text': str(i), 'bbox': bbox})
+    return blocks
+
+
+class TestNavigator(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(0)
+        self.content = random_blocks(300, 'google', rng, size=10)
+        self.layout = random_blocks(20, 'BLOCK', rng, size=120) + \
+            random_blocks(100, 'PARAGRAPH', rng) + \
+            [{'type': 'PAGE', 'bbox': BoundingBox(-10, 10000, -10, 10000)}]
+
+    def test_grid_index(self):
+        bboxes = [b['bbox'] for b in self.content]
+        index = GridIndex(bboxes)
+        for p in self.layout:
+            expected = [i for i, b in enumerate(bboxes)
+                        if b.intersects(p['bbox'])]
+            self.assertEqual(index.query(p['bbox']), expected)
+        self.assertEqual(GridIndex([]).query(bboxes[0]), [])
+
+    def test_get(self):
+        navigator = LazyLayoutNavigator(self.content, self.layout)
+        for name in ('BLOCK', 'PARAGRAPH', 'PAGE'):
+            parents = [p for p in self.layout if p['type'] == name]
+            navigators = navigator.get(name)
+            self.assertEqual(len(navigators), len(parents))
+            for p, n in zip(parents, navigators):
+                self.assertEqual(n._layout, [
+                    l for l in self.layout if l['bbox'].overlap(p['bbox'])])
+                self.assertEqual(n._content, [
+                    c for c in self.content
+                    if c['bbox'].overlap(p['bbox']) > .6])
+
+    def test_lazy_hierarchy(self):
+        rng = random.Random(1)
+        content = random_blocks(200, 'google', rng, size=10)
+        layout = random_blocks(5, 'BLOCK', rng, size=150) + \
+            random_blocks(30, 'PARAGRAPH', rng, size=60) + \
+            random_blocks(200, 'WORD', rng, size=10)
+        navigator = LazyLayoutNavigator(content, layout)
+        blocks = navigator.children()
+        self.assertEqual(len(blocks), 5)
+        self.assertIsNone(blocks[1]._layout_ids)
+        self.assertIs(navigator.get('BLOCK')[0], blocks[0])
+        eager = LazyLayoutNavigator(blocks[0]._content, blocks[0]._layout)
+        paragraphs = blocks[0].children()
+        self.assertEqual([p.block['type'] for p in paragraphs],
+                         len(paragraphs) * ['PARAGRAPH'])
+        for lazy, expected in zip(paragraphs, eager.get('PARAGRAPH')):
+            self.assertEqual(lazy._layout, expected._layout)
+            self.assertEqual(lazy._content, expected._content)
+            self.assertEqual(lazy.content(' '), expected.content(' '))
+            self.assertEqual(len(lazy.children()),
+                             len(lazy.get('WORD')))
+        self.assertIsNone(blocks[1]._layout_ids)
+        words = [w for p in paragraphs for w in p.children()]
+        self.assertTrue(all(w.children() == [] for w in words))
+
+
+if __name__ == '__main__':
+    unittest.main()
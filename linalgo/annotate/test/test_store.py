@@ -0,0 +1,109 @@
+import unittest
+
+import numpy as np
+
+from linalgo.annotate.models import Annotation
+from linalgo.annotate.store import AnnotationStore, Interner, \
+    parse_timestamps
+from .fixtures import ANNOTATIONS
+
+
+def make_records():
+    fixture = ANNOTATIONS[0]
+    records = []
+    for i, (doc, annotator, entity, created) in enumerate([
+            ('d1', 'a1', 'e1', '2021-01-01T00:00:00Z'),
+            ('d1', 'a2', 'e2', '2021-01-03T00:00:00Z'),
+            ('d1', 'a1', 'e2', '2021-01-02T00:00:00Z'),
+            ('d2', 'a1', 'e1', '2021-01-01T00:00:00Z'),
+            ('d2', 'a2', 'e1', '2021-01-05T00:00:00+01:00')]):
+        records.append({**fixture, 'id': f'store-{i}', 'document': doc,
+                        'annotator': annotator, 'entity': entity,
+                        'created': created, 'target': str(fixture['target'])})
+    return records
+
+
+class TestAnnotationStore(unittest.TestCase):
+
+    def setUp(self):
+        self.store = AnnotationStore.from_records(make_records())
+
+    def test_columns(self):
+        self.assertEqual(len(self.store), 5)
+        self.assertEqual(self.store.document.dtype, np.int32)
+        self.assertEqual(self.store.decode('document'),
+                         ['d1', 'd1', 'd1', 'd2', 'd2'])
+        self.assertEqual(self.store.created[4],
+                         parse_timestamps(['2021-01-04T23:00:00Z'])[0])
+
+    def test_filter(self):
+        store = self.store.filter(annotator='a1', entity=['e1', 'e2'])
+        self.assertEqual(list(store.ids), ['store-0', 'store-2', 'store-3'])
+        store = self.store.filter(
+            created_after=parse_timestamps(['2021-01-02T00:00:00Z'])[0])
+        self.assertEqual(len(store), 3)
+        self.assertEqual(len(self.store.filter(annotator='unknown')), 0)
+
+    def test_groupby_count(self):
+        keys, counts = self.store.groupby_count(('document', 'entity'))
+        groups = dict(zip(zip(self.store.decode('document', keys['document']),
+                              self.store.decode('entity', keys['entity'])),
+                          counts))
+        self.assertEqual(groups, {('d1', 'e1'): 1, ('d1', 'e2'): 2,
+                                  ('d2', 'e1'): 2})
+
+    def test_latest(self):
+        latest = self.store.latest(by=('document', 'annotator'))
+        self.assertEqual(sorted(latest.ids),
+                         ['store-1', 'store-2', 'store-3', 'store-4'])
+
+    def test_vote(self):
+        winners, agreement = self.store.vote()
+        self.assertEqual(winners.decode('document'), ['d1', 'd2'])
+        self.assertEqual(winners.decode('entity'), ['e2', 'e1'])
+        self.assertEqual(list(winners.ids), ['store-1', 'store-4'])
+        np.testing.assert_allclose(agreement, [1., 1.])
+        store = self.store.filter(document='d1')
+        store = store[store.ids != 'store-2']
+        # a1 votes e1 and a2 votes e2 later
+        winners, agreement = store.vote()
+        self.assertEqual(winners.decode('entity'), ['e2'])
+        winners, agreement = store.vote(weights={'a1': 3},
+                                        tie_break='weight')
+        self.assertEqual(winners.decode('entity'), ['e1'])
+        np.testing.assert_allclose(agreement, [.75])
+        with self.assertRaises(ValueError):
+            store.vote(tie_break='oldest')
+
+    def test_missing(self):
+        interner = Interner()
+        codes = interner.encode(['a', None, 'b', np.nan, 'a'])
+        self.assertEqual(codes.tolist(), [0, -1, 1, -1, 0])
+        self.assertEqual(interner.values, ['a', 'b'])
+        self.assertEqual(interner.encode([None]).tolist(), [-1])
+        records = make_records()
+        records.append({**records[1], 'id': 'store-5', 'entity': None,
+                        'created': '2021-01-04T00:00:00Z'})
+        store = AnnotationStore.from_records(records)
+        self.assertEqual(store.entity[-1], -1)
+        self.assertEqual(store.decode('entity')[-1], None)
+        self.assertEqual(len(store.filter(entity=None)), 1)
+        # a2's annotation without an entity isn't a vote
+        winners, agreement = store.vote()
+        self.assertEqual(winners.decode('entity'), ['e2', 'e1'])
+        np.testing.assert_allclose(agreement, [1., 1.])
+
+    def test_round_trip(self):
+        annotations = self.store.to_annotations()
+        self.assertEqual(annotations[0].document.id, 'd1')
+        self.assertEqual(annotations[0].target.selectors[0].width,
+                         ANNOTATIONS[0]['target']['selector'][0]['width'])
+        store = AnnotationStore.from_annotations(annotations)
+        np.testing.assert_array_equal(store.created, self.store.created)
+        self.assertEqual(store.decode('entity'), self.store.decode('entity'))
+        self.assertIs(Annotation(unique_id='store-0', entity=None,
+                                 document=None), annotations[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+import unittest
+
+import numpy as np
+
+from linalgo.annotate.models import Annotation, Document, Entity, Registry, \
+    Task
+from linalgo.annotate.transformers import BinaryTransformer, \
+    MultiClassTransformer, MultiLabelTransformer
+
+
+def make_task():
+    """Two labeled documents and one without annotations."""
+    task = Task(unique_id='transformers-task')
+    other = Task(unique_id='transformers-other')
+    pos, neg = Entity(unique_id='pos', name='POS'), \
+        Entity(unique_id='neg', name='NEG')
+    docs = [Document(unique_id=f'transformers-doc-{i}', content=f'text {i}')
+            for i in range(3)]
+    task.documents = docs
+    for doc, entity, annotator, task_, created in [
+            (docs[0], pos, 'a1', task, '2021-01-02T00:00:00Z'),
+            (docs[0], neg, 'a2', task, '2021-01-03T00:00:00Z'),
+            (docs[0], pos, 'a2', other, '2021-01-04T00:00:00Z'),
+            (docs[0], pos, 'a2', task, '2021-01-01T00:00:00Z'),
+            (docs[1], pos, 'a1', task, '2021-01-01T00:00:00Z')]:
+        task.annotations.append(Annotation(
+            entity=entity, document=doc, annotator=annotator, task=task_,
+            created=created))
+    return task, pos, neg
+
+
+class TestTransformers(unittest.TestCase):
+
+    def setUp(self):
+        with Registry():
+            self.task, self.pos, self.neg = make_task()
+
+    def test_binary(self):
+        texts, labels = BinaryTransformer([self.neg]).transform(self.task)
+        self.assertEqual(texts, ['text 0', 'text 1'])
+        self.assertEqual(labels, [True, False])
+
+    def test_multi_class(self):
+        transformer = MultiClassTransformer()
+        self.assertEqual(transformer.transform(self.task, keep_ids=True), (
+            ['transformers-doc-0', 'transformers-doc-1'],
+            ['text 0', 'text 1'], ['NEG', 'POS']))
+        texts, labels = transformer.transform(self.task, ignore=[self.neg])
+        self.assertEqual(labels, ['POS', 'POS'])
+        with self.assertRaises(NotImplementedError):
+            transformer.transform(self.task, strategy='oldest')
+
+    def test_unnamed_entity(self):
+        with Registry():
+            unnamed = Entity(unique_id='unnamed')
+            doc = Document(unique_id='transformers-doc-3', content='text 3')
+            self.task.documents.append(doc)
+            self.task.annotations.append(Annotation(
+                entity=unnamed, document=doc, annotator='a1', task=self.task,
+                created='2021-01-01T00:00:00Z'))
+        texts, labels = MultiClassTransformer().transform(self.task)
+        self.assertEqual(texts, ['text 0', 'text 1', 'text 3'])
+        self.assertEqual(labels, ['NEG', 'POS', None])
+        texts, labels = MultiClassTransformer().transform(
+            self.task, strategy='majority')
+        self.assertEqual(labels, ['NEG', 'POS', None])
+        texts, labels = MultiLabelTransformer().transform(self.task)
+        self.assertEqual(labels[-1], {None})
+        transformer = MultiClassTransformer()
+        texts, labels = transformer.transform(self.task, encode=True)
+        classes = transformer.classes_
+        self.assertEqual(sorted(classes), ['NEG', 'POS'])
+        self.assertEqual(labels.tolist(),
+                         [classes.index('NEG'), classes.index('POS'), -1])
+        transformer = MultiLabelTransformer()
+        texts, labels = transformer.transform(self.task, sparse=True)
+        self.assertEqual(labels.shape, (3, 2))
+        self.assertEqual(labels[2].nnz, 0)
+
+    def test_majority(self):
+        transformer = MultiClassTransformer()
+        # doc-0: a1 votes POS, a2 votes NEG (its latest in the task)
+        self.assertEqual(MultiClassTransformer.vote(self.task), {
+            'transformers-doc-0': ('NEG', .5),
+            'transformers-doc-1': ('POS', 1.)})
+        votes = MultiClassTransformer.vote(
+            self.task, weights={'a1': 2.}, tie_break='weight')
+        self.assertEqual(votes['transformers-doc-0'], ('POS', 2 / 3))
+        votes = MultiClassTransformer.vote(
+            self.task, weights={'a1': 1., 'a2': 1.}, tie_break='weight')
+        self.assertEqual(votes['transformers-doc-0'], ('NEG', .5))
+        texts, labels = transformer.transform(
+            self.task, strategy='majority', min_agreement=.6)
+        self.assertEqual((texts, labels), (['text 1'], ['POS']))
+        texts, labels = transformer.transform(
+            self.task, strategy='majority', ignore=[self.neg])
+        self.assertEqual(labels, ['POS', 'POS'])
+        # annotations of the task's documents missing from task.annotations
+        with Registry():
+            Annotation(entity=self.neg, document=self.task.documents[2],
+                       annotator='a1', task=self.task,
+                       created='2021-01-01T00:00:00Z')
+        for strategy in ('latest', 'majority'):
+            texts, labels = transformer.transform(self.task, strategy)
+            self.assertEqual(labels, ['NEG', 'POS', 'NEG'])
+
+    def test_multi_label(self):
+        transformer = MultiLabelTransformer()
+        texts, labels = transformer.transform(self.task)
+        self.assertEqual(labels, [{'POS', 'NEG'}, {'POS'}])
+        texts, labels = transformer.transform(
+            self.task, strategy='keep-last-by-annotator')
+        self.assertEqual(labels, [{'POS'}, {'POS'}])
+
+    def test_encode(self):
+        self.task.entities = [self.neg]
+        texts, labels = BinaryTransformer([self.neg]).transform(
+            self.task, encode=True)
+        self.assertEqual(labels.dtype, np.int8)
+        self.assertEqual(labels.tolist(), [1, 0])
+        transformer = MultiClassTransformer()
+        texts, labels = transformer.transform(self.task, encode=True)
+        self.assertEqual(transformer.classes_, ['NEG', 'POS'])
+        self.assertEqual(labels.tolist(), [0, 1])
+
+    def test_sparse(self):
+        self.task.entities = [self.neg, self.pos]
+        transformer = MultiLabelTransformer()
+        for strategy in ('keep-all', 'keep-last-by-annotator'):
+            texts, expected = transformer.transform(self.task, strategy)
+            texts_, labels = transformer.transform(
+                self.task, strategy, sparse=True)
+            self.assertEqual(texts_, texts)
+            self.assertEqual(labels.shape, (2, 2))
+            self.assertEqual(
+                [{transformer.classes_[j] for j in row.indices}
+                 for row in labels], expected)
+            self.assertEqual(labels.max(), 1)
+        with self.assertRaises(NotImplementedError):
+            transformer.transform(self.task, 'keep-first', sparse=True)
+        with self.assertRaises(TypeError):
+            transformer.transform(self.task, sparse=True, max_workers=2)
+
+    def test_iter_transform(self):
+        transformer = MultiClassTransformer()
+        expected = [[('transformers-doc-0', 'text 0', 'NEG')],
+                    [('transformers-doc-1', 'text 1', 'POS')], []]
+        self.assertEqual(
+            list(transformer.iter_transform(self.task, batch_size=1)),
+            expected)
+        self.assertEqual(list(transformer.iter_transform(
+            self.task, batch_size=1, max_workers=2)), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,59 +1,315 @@
-from typing import List, Union
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterator, List, Tuple, Union
+
+import numpy as np
+from scipy.sparse import csr_matrix
 
 from .models import Entity, Task
+from .store import AnnotationStore
+
+# returned by `Transformer.label` for documents without any example
+SKIP = object()
+
+
+def entity_index(task: Task) -> Dict[str, int]:
+    """
+    Map the names of the entities of a task to column indices, in the order
+    of `task.entities` followed by the other annotated entities. Entities
+    without a name are left out.
+    """
+    index = {}
+    entities = list(task.entities)
+    for doc in task.documents:
+        entities.extend(doc.annotations.entities)
+    for e in entities:
+        if e is not None and e.name is not None and e.name not in index:
+            index[e.name] = len(index)
+    return index
+
+
+def _label_batch(label, options, rows):
+    batch = []
+    for doc_id, text, annotations in rows:
+        y = label(annotations, **options)
+        if y is not SKIP:
+            batch.append((doc_id, text, y))
+    return batch
+
+
+class Transformer:
+    """
+    Base class of the transformers turning the documents of a task into
+    `(doc_id, text, label)` examples.
+
+    Annotations are flattened to plain `(entity_id, entity_name,
+    annotator_id, task_id, created)` tuples, so that labels can be computed
+    in worker processes. Subclasses implement `label` and `options`.
+    """
+
+    @staticmethod
+    def label(annotations: List[Tuple], **options):
+        """The label of a document, or `SKIP` to leave it out."""
+        raise NotImplementedError()
+
+    def options(self, task: Task, **kwargs) -> Dict:
+        return kwargs
+
+    @staticmethod
+    def rows(task: Task) -> Iterator[Tuple]:
+        for doc in task.documents:
+            annotations = [
+                (getattr(a.entity, 'id', None),
+                 getattr(a.entity, 'name', None),
+                 getattr(a.annotator, 'id', None),
+                 getattr(a.task, 'id', None), a.created)
+                for a in doc.annotations]
+            yield doc.id, doc.content, annotations
+
+    def iter_transform(self, task: Task, batch_size: int = 1000,
+                       max_workers: int = 1, **kwargs):
+        """
+        Stream the examples of a task.
+
+        Parameters
+        ----------
+        task: Task
+            The task to transform
+        batch_size: int
+            The number of documents per batch
+        max_workers: int
+            Label the batches in that many processes. Batches are still
+            yielded in the order of the documents.
+
+        Return
+        ------
+        An iterator over lists of `(doc_id, text, label)` tuples. Batches
+        can be shorter than `batch_size` when documents are skipped.
+        """
+        options = self.options(task, **kwargs)
+        rows = self.rows(task)
+        batches = iter(lambda: list(islice(rows, batch_size)), [])
+        if max_workers == 1:
+            for batch in batches:
+                yield _label_batch(self.label, options, batch)
+            return
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            pending = deque()
+            for batch in batches:
+                pending.append(executor.submit(
+                    _label_batch, self.label, options, batch))
+                if len(pending) >= 2 * max_workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def _transform(self, task, **kwargs):
+        doc_ids, texts, labels = [], [], []
+        for batch in self.iter_transform(task, **kwargs):
+            for doc_id, text, label in batch:
+                doc_ids.append(doc_id)
+                texts.append(text)
+                labels.append(label)
+        return doc_ids, texts, labels
 
 
-class BinaryTransformer:
+class BinaryTransformer(Transformer):
 
     def __init__(self, pos_labels: List[Entity]):
         self.positive = pos_labels
 
-    def transform(self, task: Task):
-        texts, labels = [], []
-        for doc in task.documents:
-            if len(doc.annotations) > 0:
-                texts.append(doc.content)
-                labels.append(max(l in doc.entities for l in self.positive))
+    def options(self, task: Task, **kwargs):
+        return {'positive': {getattr(e, 'id', e) for e in self.positive},
+                **kwargs}
+
+    @staticmethod
+    def label(annotations, positive=()):
+        if len(annotations) == 0:
+            return SKIP
+        return any(a[0] in positive for a in annotations)
+
+    def transform(self, task: Task, encode=False, **kwargs):
+        """
+        Return
+        ------
+        A tuple `(texts, labels)`. With `encode`, labels are an int8 array.
+        """
+        _, texts, labels = self._transform(task, **kwargs)
+        if encode:
+            labels = np.array(labels, dtype=np.int8)
         return texts, labels
 
 
-class MultiClassTransformer:
+class MultiClassTransformer(Transformer):
 
-    def transform(self, task: Task, strategy='latest', ignore=[], keep_ids=False):
+    def options(self, task: Task, strategy='latest', ignore=[]):
         if strategy not in ('latest', 'majority'):
             raise NotImplementedError(f'{strategy} is not a valid strategy.')
-        texts, labels, doc_ids = [], [], []
+        return {'task_id': task.id,
+                'ignore': {getattr(e, 'id', e) for e in ignore}}
+
+    @staticmethod
+    def vote(task: Task, ignore=[], weights: Dict[str, float] = None,
+             tie_break='latest'):
+        """
+        Majority vote of the annotators of a task on each document.
+
+        Parameters
+        ----------
+        task: Task
+            The task whose annotations are counted
+        ignore: List[Entity]
+            Entities whose annotations are not counted
+        weights: Dict[str, float]
+            Annotator ids mapped to the weight of their votes
+        tie_break: str
+            'latest' or 'weight', see `AnnotationStore.vote`
+
+        Return
+        ------
+        A dict mapping document ids to `(entity_name, agreement)` pairs
+        """
+        # the annotations of the documents, like the 'latest' strategy
+        annotations = [a for doc in task.documents for a in doc.annotations]
+        store = AnnotationStore.from_annotations(annotations)
+        mask = store.mask(task=task)
+        if len(ignore):
+            mask &= ~store.mask(entity=ignore)
+        winners, agreement = store[mask].vote(
+            weights=weights, tie_break=tie_break)
+        names = {a.entity.id: a.entity.name for a in annotations
+                 if a.entity is not None}
+        return {
+            doc_id: (names.get(entity_id), ratio)
+            for doc_id, entity_id, ratio in zip(
+                winners.decode('document'), winners.decode('entity'),
+                agreement.tolist())
+        }
+
+    def iter_transform(self, task: Task, batch_size: int = 1000,
+                       max_workers: int = 1, strategy='latest', ignore=[],
+                       weights: Dict[str, float] = None, tie_break='latest',
+                       min_agreement: float = 0.):
+        """
+        Stream the examples of a task.
+
+        With the 'majority' strategy, the vote runs once over the whole task
+        and documents whose agreement is below `min_agreement` are skipped.
+        See `Transformer.iter_transform` for the other parameters.
+        """
+        if strategy != 'majority':
+            yield from super().iter_transform(
+                task, batch_size, max_workers, strategy=strategy,
+                ignore=ignore)
+            return
+        votes = self.vote(task, ignore, weights, tie_break)
+        batch = []
         for doc in task.documents:
-            aa = [a for a in doc.annotations if a.task == task]
-            aa = [a for a in aa if a.entity not in ignore]
-            if len(aa) > 0:
-                annotations = sorted(aa, key=lambda a: a.created, reverse=True)
-                doc_ids.append(doc.id)
-                texts.append(doc.content)
-                labels.append(annotations[0].entity.name)
+            vote = votes.get(doc.id)
+            if vote is not None and vote[1] >= min_agreement:
+                batch.append((doc.id, doc.content, vote[0]))
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if len(batch):
+            yield batch
+
+    @staticmethod
+    def label(annotations, task_id=None, ignore=()):
+        latest = None
+        for a in annotations:
+            if a[3] != task_id or a[0] in ignore:
+                continue
+            if latest is None or a[4] > latest[4]:
+                latest = a
+        return SKIP if latest is None else latest[1]
+
+    def transform(self, task: Task, strategy='latest', ignore=[],
+                  keep_ids=False, encode=False, **kwargs):
+        """
+        Return
+        ------
+        A tuple `(texts, labels)`, or `(doc_ids, texts, labels)` with
+        `keep_ids`. With `encode`, labels are an int32 array of indices into
+        `self.classes_`, see `entity_index`, and -1 for unnamed entities.
+        """
+        doc_ids, texts, labels = self._transform(
+            task, strategy=strategy, ignore=ignore, **kwargs)
+        if encode:
+            index = entity_index(task)
+            self.classes_ = list(index)
+            labels = np.fromiter((index.get(label, -1) for label in labels),
+                                 dtype=np.int32, count=len(labels))
         if keep_ids:
             return doc_ids, texts, labels
         return texts, labels
 
 
-class MultiLabelTransformer:
+class MultiLabelTransformer(Transformer):
 
-    def transform(self, task: Task, strategy='keep-all'):
-        if strategy not in ('keep-all', 'keep-last-by-annotator'):
+    strategies = ('keep-all', 'keep-last-by-annotator')
+
+    def options(self, task: Task, strategy='keep-all'):
+        if strategy not in self.strategies:
             raise NotImplementedError(f'{strategy} is not a valid strategy.')
-        texts, labels = [], []
-        for doc in task.documents:
-            if len(doc.annotations) > 0:
-                texts.append(doc.content)
-                if strategy == 'keep-last-by-annotator':
-                    d = {}
-                    for a in doc.annotations:
-                        try:
-                            if d[a.annotator.id].created > a.created:
-                                d[a.annotator.id] = a
-                        except:
-                            d[a.annotator.id] = a
-                    labels.append({v.entity.name for k, v in d.items()})
-                elif strategy == 'keep-all':
-                    labels.append({e.name for e in doc.entities})
+        return {'strategy': strategy}
+
+    @staticmethod
+    def label(annotations, strategy='keep-all'):
+        if len(annotations) == 0:
+            return SKIP
+        if strategy == 'keep-all':
+            return {a[1] for a in annotations}
+        latest = {}
+        for a in annotations:
+            last = latest.get(a[2])
+            if last is None or a[4] > last[4]:
+                latest[a[2]] = a
+        return {a[1] for a in latest.values()}
+
+    def transform(self, task: Task, strategy='keep-all', sparse=False,
+                  **kwargs):
+        """
+        Return
+        ------
+        A tuple `(texts, labels)` where labels are sets of entity names, or
+        with `sparse` a CSR matrix of shape `(n_documents, n_classes)` whose
+        columns are `self.classes_`, see `entity_index`. The sparse matrix
+        is built in a single vectorized pass, so it takes none of the
+        `iter_transform` options.
+        """
+        if sparse:
+            if len(kwargs):
+                raise TypeError(
+                    f'Unexpected options with sparse: {", ".join(kwargs)}')
+            return self.transform_sparse(task, strategy)
+        _, texts, labels = self._transform(task, strategy=strategy, **kwargs)
         return texts, labels
+
+    def transform_sparse(self, task: Task, strategy='keep-all'):
+        if strategy not in self.strategies:
+            raise NotImplementedError(f'{strategy} is not a valid strategy.')
+        docs = [doc for doc in task.documents if len(doc.annotations) > 0]
+        store = AnnotationStore.from_annotations(
+            a for doc in docs for a in doc.annotations)
+        if strategy == 'keep-last-by-annotator':
+            store = store.latest(by=('document', 'annotator'))
+        index = entity_index(task)
+        self.classes_ = list(index)
+        names = {e.id: e.name for doc in docs for e in doc.annotations.entities
+                 if e is not None}
+        vocab = store.vocab
+        columns = np.array([index.get(names.get(e), -1)
+                            for e in vocab['entity'].values] + [-1])
+        rows = np.full(len(vocab['document']) + 1, -1)
+        for i, doc in enumerate(docs):
+            rows[vocab['document'].index[doc.id]] = i
+        i, j = rows[store.document], columns[store.entity]
+        keep = (i >= 0) & (j >= 0)
+        labels = csr_matrix(
+            (np.ones(keep.sum(), dtype=np.int8), (i[keep], j[keep])),
+            shape=(len(docs), len(index)))
+        labels.sum_duplicates()
+        labels.data[:] = 1
+        return [doc.content for doc in docs], labels
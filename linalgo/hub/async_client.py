@@ -0,0 +1,242 @@
+import asyncio
+import contextvars
+import functools
+
+from concurrent.futures import ThreadPoolExecutor
+
+from linalgo.annotate.models import Annotation, Annotator, Corpus, Document, \
+    Entity, Task
+from linalgo.hub.client import AssignmentType, LinalgoClient
+
+
+def run_sync(coro):
+    """
+    Run a coroutine to completion from synchronous code.
+
+    When called from a running event loop (e.g. inside a notebook), the
+    coroutine runs in a fresh event loop on a helper thread, in a copy of
+    the caller's context so that its current registry is kept.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        context = contextvars.copy_context()
+        return executor.submit(context.run, asyncio.run, coro).result()
+
+
+class AsyncLinalgoClient:
+    """
+    Asynchronous counterpart of `LinalgoClient`.
+
+    HTTP calls run on a thread pool through the pooled session of a wrapped
+    `LinalgoClient`, with at most `max_concurrency` requests in flight.
+    Independent fetches (e.g. the documents and annotations of a task) run
+    concurrently. Model objects are built on the event loop thread so that
+    registry lookups never race.
+    """
+
+    def __init__(self, token=None, api_url="http://localhost:8000",
+                 max_concurrency=8, client=None, **kwargs):
+        if client is None:
+            kwargs.setdefault('pool_size', max_concurrency)
+            client = LinalgoClient(token, api_url=api_url, **kwargs)
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self._semaphore = None
+        self._loop = None
+
+    @property
+    def api_url(self):
+        return self.client.api_url
+
+    @property
+    def endpoints(self):
+        return self.client.endpoints
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.client.close()
+
+    def _get_semaphore(self):
+        # semaphores are bound to the event loop they are first used in
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._semaphore
+
+    async def _run(self, fn, *args, **kwargs):
+        async with self._get_semaphore():
+            loop = asyncio.get_running_loop()
+            # run in the caller's context, e.g. its current registry
+            context = contextvars.copy_context()
+            return await loop.run_in_executor(
+                self._executor,
+                functools.partial(context.run, fn, *args, **kwargs))
+
+    async def request(self, url, query_params={}, timeout=None):
+        return await self._run(self.client.request, url, query_params, timeout)
+
+    async def request_csv(self, url, query_params={}, timeout=None,
+                          cache_key=None):
+        def fetch():
+            # decompress and parse the csv on the worker thread
+            return list(self.client.request_csv(
+                url, query_params, timeout, cache_key=cache_key))
+        return await self._run(fetch)
+
+    async def get_corpora(self):
+        url = f"{self.api_url}/{self.endpoints['corpora']}/"
+        res = await self.request(url)
+        return list(await asyncio.gather(
+            *[self.get_corpus(js['id']) for js in res['results']]))
+
+    async def get_corpus(self, corpus_id):
+        url = f"{self.api_url}/{self.endpoints['corpora']}/{corpus_id}/"
+        res, documents = await asyncio.gather(
+            self.request(url), self.get_corpus_documents(corpus_id))
+        with self.client.activate():
+            corpus = Corpus.from_dict(res)
+        corpus.documents = documents
+        return corpus
+
+    async def request_all(self, url, query_params={}, page_size=1000,
+                          max_workers=None):
+        return await self._run(self.client.request_all, url, query_params,
+                               page_size, max_workers)
+
+    async def get_corpus_documents(self, corpus_id):
+        url = f"{self.api_url}/{self.endpoints['documents']}/"
+        res = await self.request_all(url, {'corpus': corpus_id})
+        with self.client.activate():
+            return [Document.from_dict(d) for d in res]
+
+    async def get_tasks(self, task_ids=[]):
+        if len(task_ids) == 0:
+            url = f"{self.api_url}/{self.endpoints['task']}/"
+            res = await self.request(url)
+            task_ids = [js['id'] for js in res['results']]
+        return list(await asyncio.gather(
+            *[self.get_task(task_id) for task_id in task_ids]))
+
+    async def get_task_documents(self, task_id):
+        query_params = {
+            'task_id': task_id,
+            'output_format': 'zip',
+            'only_documents': True
+        }
+        api_url = "{}/{}/".format(
+            self.api_url, self.endpoints['documents-export'])
+        records = await self.request_csv(
+            api_url, query_params, cache_key=(task_id, 'documents-export'))
+        with self.client.activate():
+            return Document.from_records(records)
+
+    async def get_task_annotations(self, task_id):
+        query_params = {'task_id': task_id, 'output_format': 'zip'}
+        api_url = "{}/{}/".format(
+            self.api_url, self.endpoints['annotations-export'])
+        records = await self.request_csv(
+            api_url, query_params, cache_key=(task_id, 'annotations-export'))
+        with self.client.activate():
+            return Annotation.from_records(
+                row for row in records if not row.get('deleted'))
+
+    async def get_entities(self, task_id):
+        params = {'tasks': task_id}
+        entities_url = "{}/{}".format(self.api_url, self.endpoints['entities'])
+        res = await self.request_all(entities_url, params)
+        with self.client.activate():
+            return [Entity.from_dict(e) for e in res]
+
+    async def get_task(self, task_id, verbose=False):
+        task_url = "{}/{}/{}/".format(
+            self.api_url, self.endpoints['task'], task_id)
+        if verbose:
+            print(f'Retrivieving task with id {task_id}...')
+        task_json = await self.request(task_url)
+        with self.client.activate():
+            task = Task.from_dict(task_json)
+        task.annotators, task.entities, task.documents, task.annotations = \
+            await asyncio.gather(
+                self.get_annotators(task),
+                self.get_entities(task_id),
+                self.get_task_documents(task_id),
+                self.get_task_annotations(task_id)
+            )
+        self.client.sync_marks[task.id] = max(
+            (a.created for a in task.annotations), default=None)
+        if verbose:
+            print(f'({len(task.annotators)} annotators, '
+                  f'{len(task.entities)} entities, '
+                  f'{len(task.documents)} documents, '
+                  f'{len(task.annotations)} annotations found)')
+        return task
+
+    async def get_annotators(self, task=None):
+        params = {'tasks': task.id}
+        annotators_url = "{}/{}/".format(
+            self.api_url, self.endpoints['annotators'])
+        res = await self.request_all(annotators_url, params)
+        with self.client.activate():
+            return [Annotator.from_dict(a) for a in res]
+
+    async def create_annotator(self, annotator):
+        return await self._run(self.client.create_annotator, annotator)
+
+    async def create_annotations(self, annotations):
+        return await self._run(self.client.create_annotations, annotations)
+
+    async def assign(self, document, annotator, task, reviewee=None,
+                     assignment_type=AssignmentType.LABEL.value):
+        return await self._run(self.client.assign, document, annotator, task,
+                               reviewee, assignment_type)
+
+    async def unassign(self, status_id):
+        return await self._run(self.client.unassign, status_id)
+
+    async def sync_task(self, task, verbose=False):
+        return await self._run(self.client.sync_task, task, verbose)
+
+    async def get_schedule(self, task, max_workers=None):
+        return await self._run(self.client.get_schedule, task, max_workers)
+
+
+class SyncLinalgoClient(LinalgoClient):
+    """
+    Drop-in replacement for `LinalgoClient` whose multi-request methods
+    (`get_task`, `get_tasks`, `get_corpus`, `get_corpora`) fetch concurrently
+    through an `AsyncLinalgoClient` sharing the same session.
+    """
+
+    def __init__(self, token, api_url="http://localhost:8000",
+                 max_concurrency=8, **kwargs):
+        kwargs.setdefault('pool_size', max_concurrency)
+        super().__init__(token, api_url=api_url, **kwargs)
+        self.async_client = AsyncLinalgoClient(
+            client=self, max_concurrency=max_concurrency)
+
+    def close(self):
+        self.async_client._executor.shutdown(wait=False)
+        super().close()
+
+    def get_corpora(self):
+        return run_sync(self.async_client.get_corpora())
+
+    def get_corpus(self, corpus_id):
+        return run_sync(self.async_client.get_corpus(corpus_id))
+
+    def get_tasks(self, task_ids=[]):
+        return run_sync(self.async_client.get_tasks(task_ids))
+
+    def get_task(self, task_id, verbose=False):
+        return run_sync(self.async_client.get_task(task_id, verbose))
@@ -0,0 +1,221 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import hashlib
+import json
+import threading
+import time
+
+import requests
+
+from linalgo.annotate.serializers import AnnotationSerializer
+from linalgo.hub.session import RETRY_STATUSES
+
+# statuses blaming the content of a chunk rather than the request itself
+ITEM_ERROR_STATUSES = (400, 409, 422)
+
+
+class BulkReport:
+    """
+    Outcome of a bulk upload.
+
+    Attributes
+    ----------
+    succeeded: list
+        The ids of the items accepted by the server
+    failed: dict
+        The ids of the rejected items mapped to the error returned
+    responses: list
+        The decoded json body of every successful chunk
+    planned: list
+        The items that would have been sent, for dry runs
+    """
+
+    def __init__(self):
+        self.succeeded = []
+        self.failed = {}
+        self.responses = []
+        self.planned = []
+        self.n_chunks = 0
+        self.n_requests = 0
+        self.n_retries = 0
+        self.bytes_sent = 0
+        self.elapsed = 0.
+
+    @property
+    def n_items(self):
+        return len(self.succeeded) + len(self.failed)
+
+    @property
+    def items_per_second(self):
+        return self.n_items / self.elapsed if self.elapsed else 0.
+
+    @property
+    def bytes_per_second(self):
+        return self.bytes_sent / self.elapsed if self.elapsed else 0.
+
+    @property
+    def ok(self):
+        return len(self.failed) == 0
+
+    def stats(self):
+        return {
+            'items': self.n_items,
+            'succeeded': len(self.succeeded),
+            'failed': len(self.failed),
+            'chunks': self.n_chunks,
+            'requests': self.n_requests,
+            'retries': self.n_retries,
+            'bytes_sent': self.bytes_sent,
+            'elapsed': self.elapsed,
+            'items_per_second': self.items_per_second,
+            'bytes_per_second': self.bytes_per_second,
+        }
+
+    def __repr__(self):
+        return (f'BulkReport::{len(self.succeeded)} succeeded, '
+                f'{len(self.failed)} failed')
+
+
+class BulkUploader:
+    """
+    Upload many items to a list endpoint in concurrent, size-bounded chunks.
+
+    Every item is serialized to json once. Chunks hold at most `chunk_size`
+    items and `max_chunk_bytes` bytes and are posted concurrently by
+    `max_workers` threads over the pooled session of `client`. Each chunk
+    carries an `Idempotency-Key` header derived from its content, so that
+    retries after timeouts, 429 or 5xx errors can be deduplicated by the
+    server. Chunks rejected as invalid (400, 409, 422) are split in halves
+    until the offending items are isolated and reported individually.
+
+    Parameters
+    ----------
+    client: LinalgoClient
+        The client whose session is used
+    chunk_size: int
+        Maximum number of items per request
+    max_chunk_bytes: int
+        Maximum size in bytes of a request body
+    max_workers: int
+        Number of concurrent requests, defaults to the client `pool_size`
+    max_retries: int
+        Number of retries of a chunk on transient errors
+    backoff_factor: float
+        Sleep `backoff_factor * 2 ** retry` seconds between retries
+    """
+
+    def __init__(self, client, chunk_size=1000, max_chunk_bytes=2 ** 22,
+                 max_workers=None, max_retries=3, backoff_factor=0.5):
+        self.client = client
+        self.chunk_size = chunk_size
+        self.max_chunk_bytes = max_chunk_bytes
+        self.max_workers = max_workers or client.pool_size
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+
+    def chunks(self, items):
+        """Split `(id, bytes)` pairs into size-bounded chunks."""
+        chunk, size = [], 2
+        for item in items:
+            n_bytes = len(item[1]) + 1
+            if len(chunk) and (len(chunk) == self.chunk_size or
+                               size + n_bytes > self.max_chunk_bytes):
+                yield chunk
+                chunk, size = [], 2
+            chunk.append(item)
+            size += n_bytes
+        if len(chunk):
+            yield chunk
+
+    def upload(self, url, items, method='POST'):
+        """
+        Parameters
+        ----------
+        url: str
+            The list endpoint to send the chunks to
+        items: Iterable[Tuple[str, dict]]
+            `(id, payload)` pairs where `payload` is json serializable
+
+        Return
+        ------
+        A `BulkReport`
+        """
+        report = BulkReport()
+        lock = threading.Lock()
+        start = time.time()
+        encoded = ((i, json.dumps(payload).encode('utf-8'))
+                   for i, payload in items)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = set()
+            for chunk in self.chunks(encoded):
+                report.n_chunks += 1
+                pending.add(executor.submit(
+                    self._send_chunk, url, method, chunk, report, lock))
+                # only serialize ahead what the workers can absorb
+                if len(pending) >= 2 * self.max_workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+            for future in pending:
+                future.result()
+        report.elapsed = time.time() - start
+        return report
+
+    def upload_annotations(self, annotations):
+        """
+        Create annotations on the hub.
+
+        Parameters
+        ----------
+        annotations: Iterable[Annotation]
+            The annotations to create, serialized with `AnnotationSerializer`
+
+        Return
+        ------
+        A `BulkReport`
+        """
+        url = "{}/{}/".format(
+            self.client.api_url, self.client.endpoints['annotations'])
+        items = ((a.id, AnnotationSerializer(a).serialize())
+                 for a in annotations)
+        return self.upload(url, items)
+
+    def _send_chunk(self, url, method, chunk, report, lock):
+        body = b'[' + b','.join(payload for _, payload in chunk) + b']'
+        headers = {
+            'Content-Type': 'application/json',
+            'Idempotency-Key': hashlib.sha1(body).hexdigest()
+        }
+        res, error = None, None
+        for retry in range(self.max_retries + 1):
+            if retry > 0:
+                with lock:
+                    report.n_retries += 1
+                time.sleep(self.backoff_factor * 2 ** (retry - 1))
+            with lock:
+                report.n_requests += 1
+                report.bytes_sent += len(body)
+            try:
+                res = self.client._send(method, url, data=body, headers=headers)
+            except requests.exceptions.RequestException as e:
+                res, error = None, str(e)
+                continue
+            if res.status_code in RETRY_STATUSES:
+                error = f'status {res.status_code}: {res.text}'
+                continue
+            if res.status_code < 300:
+                with lock:
+                    report.succeeded.extend(i for i, _ in chunk)
+                    if res.content:
+                        report.responses.append(res.json())
+                return
+            error = f'status {res.status_code}: {res.text}'
+            break
+        if res is None or res.status_code not in ITEM_ERROR_STATUSES or \
+                len(chunk) == 1:
+            with lock:
+                report.failed.update((i, error) for i, _ in chunk)
+            return
+        # the chunk was rejected: bisect to find the invalid items
+        middle = len(chunk) // 2
+        self._send_chunk(url, method, chunk[:middle], report, lock)
+        self._send_chunk(url, method, chunk[middle:], report, lock)
@@ -0,0 +1,189 @@
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'linalgo')
+
+
+class ExportCache:
+    """
+    Size-bounded on-disk LRU cache of raw task exports.
+
+    Each entry is keyed by task id, endpoint and hub url, and stores the
+    export as downloaded along with the `ETag` and `Last-Modified` headers it
+    was served with, so that it can be revalidated with a conditional
+    request.
+    The index survives restarts of the interpreter.
+
+    Parameters
+    ----------
+    path: str
+        The directory where exports are stored
+    max_size: int
+        The maximum total size in bytes of the cached exports. Least recently
+        used entries are evicted first.
+    """
+
+    index_name = 'index.json'
+
+    def __init__(self, path=DEFAULT_CACHE_DIR, max_size=2 ** 30):
+        self.path = path
+        self.max_size = max_size
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+        self._entries = self._load_index()
+
+    @staticmethod
+    def key(task_id, endpoint, api_url=None):
+        if api_url is None:
+            return f'{task_id}-{endpoint}'
+        digest = hashlib.sha1(api_url.encode('utf-8')).hexdigest()[:16]
+        return f'{task_id}-{endpoint}-{digest}'
+
+    @property
+    def size(self):
+        return sum(e['size'] for e in self._entries.values())
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def _load_index(self):
+        try:
+            with open(os.path.join(self.path, self.index_name)) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return OrderedDict()
+        # drop entries whose export was removed behind our back
+        return OrderedDict(
+            (e['key'], e) for e in entries
+            if os.path.exists(self._file(e['key'])))
+
+    def _save_index(self):
+        fd, tmp = tempfile.mkstemp(dir=self.path)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(list(self._entries.values()), f)
+        os.replace(tmp, os.path.join(self.path, self.index_name))
+
+    def _file(self, key):
+        return os.path.join(self.path, f'{key}.zip')
+
+    def get(self, key):
+        """Return the metadata of an entry, or `None` if it isn't cached."""
+        with self._lock:
+            return self._entries.get(key)
+
+    def headers(self, key):
+        """Conditional request headers to revalidate an entry."""
+        entry = self.get(key)
+        headers = {}
+        if entry is None:
+            return headers
+        if entry['etag'] is not None:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified'] is not None:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def open(self, key):
+        """
+        Open a cached export for reading and mark it as recently used.
+
+        Raise a `KeyError` if the entry was evicted.
+        """
+        with self._lock:
+            if key not in self._entries:
+                raise KeyError(key)
+            try:
+                f = open(self._file(key), 'rb')
+            except FileNotFoundError:
+                # removed by another process sharing the directory
+                self._remove(key)
+                self._save_index()
+                raise KeyError(key)
+            self._entries.move_to_end(key)
+            self._save_index()
+            return f
+
+    def store(self, task_id, endpoint, chunks, etag=None, last_modified=None,
+              api_url=None):
+        """
+        Write an export to the cache from an iterable of byte chunks.
+
+        Return
+        ------
+        The key of the new entry
+        """
+        key = self.key(task_id, endpoint, api_url)
+        fd, tmp = tempfile.mkstemp(dir=self.path)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        with self._lock:
+            os.replace(tmp, self._file(key))
+            self._entries.pop(key, None)
+            self._entries[key] = {
+                'key': key,
+                'task_id': task_id,
+                'endpoint': endpoint,
+                'api_url': api_url,
+                'etag': etag,
+                'last_modified': last_modified,
+                'size': os.path.getsize(self._file(key))
+            }
+            self._evict(keep=key)
+            self._save_index()
+        return key
+
+    def _evict(self, keep=None):
+        for key in list(self._entries):
+            if self.size <= self.max_size:
+                break
+            if key != keep:
+                self._remove(key)
+
+    def _remove(self, key):
+        self._entries.pop(key)
+        try:
+            os.remove(self._file(key))
+        except FileNotFoundError:
+            pass
+
+    def invalidate(self, task_id=None, endpoint=None):
+        """
+        Remove cached exports.
+
+        Parameters
+        ----------
+        task_id: str
+            Only remove the exports of this task
+        endpoint: str
+            Only remove the exports of this endpoint
+
+        Return
+        ------
+        The number of removed entries
+        """
+        with self._lock:
+            keys = [
+                k for k, e in self._entries.items()
+                if (task_id is None or e['task_id'] == task_id) and
+                (endpoint is None or e['endpoint'] == endpoint)
+            ]
+            for key in keys:
+                self._remove(key)
+            self._save_index()
+            return len(keys)
+
+    def clear(self):
+        return self.invalidate()
@@ -1,13 +1,21 @@
 import io
 from enum import Enum
 
-from contextlib import closing
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, nullcontext
 import csv
-import requests
+import functools
+from itertools import islice
+import math
+import tempfile
+import time
 import zipfile
 
 from linalgo.annotate.models import Annotation, Annotator, Corpus, Document, \
     Entity, Task
+from linalgo.hub.bulk import BulkReport
+from linalgo.hub.session import DEFAULT_TIMEOUT, create_session
 
 
 class AssignmentType(Enum):
@@ -20,6 +28,64 @@ class AssignmentStatus(Enum):
     COMPLETED = 'C'
 
 
+# size in bytes of the chunks in which exports are downloaded
+CHUNK_SIZE = 1 << 20
+# number of export rows turned into model objects at once
+BATCH_SIZE = 10000
+
+
+class ExportRows:
+    """
+    Iterator over the rows of a zipped csv export, as dicts.
+
+    The underlying file is closed once the rows are exhausted, on `close`,
+    when leaving a `with` block or when the iterator is garbage collected,
+    so that exports dropped before the end don't leak temporary files.
+    """
+
+    def __init__(self, spool):
+        self._spool = spool
+        self._rows = self._read(spool)
+
+    @staticmethod
+    def _read(spool):
+        with spool, zipfile.ZipFile(spool) as root:
+            names = root.namelist()
+            if len(names) == 0:
+                return
+            with root.open(names[0]) as member:
+                text = io.TextIOWrapper(member, encoding='utf-8', newline='')
+                yield from csv.DictReader(text)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._rows)
+
+    def close(self):
+        self._rows.close()
+        self._spool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+
+def in_registry(method):
+    """Create the model objects of `method` in the client registry."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.activate():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
 class LinalgoClient:
 
     endpoints = {
@@ -31,44 +97,210 @@ class LinalgoClient:
         'task': 'tasks',
         'annotations-export': 'annotations/export',
         'documents-export': 'documents/export',
+        'document-status': 'document-status',
     }
 
-    def __init__(self, token, api_url="http://localhost:8000"):
+    def __init__(self, token, api_url="http://localhost:8000", pool_size=10,
+                 max_retries=3, backoff_factor=0.5, timeout=DEFAULT_TIMEOUT,
+                 session=None, cache=None, registry=None):
         self.api_url = api_url
         self.access_token = token
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.cache = cache
+        self.registry = registry
+        # latest annotation timestamp retrieved for each task
+        self.sync_marks = {}
+        if session is None:
+            session = create_session(
+                token, pool_size=pool_size, max_retries=max_retries,
+                backoff_factor=backoff_factor)
+        self.session = session
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Close all pooled connections and release the client registry."""
+        self.session.close()
+        if self.registry is not None:
+            self.registry.clear()
 
-    def request(self, url, query_params={}):
-        headers = {'Authorization': f"Token {self.access_token}"}
-        res = requests.get(url, headers=headers, params=query_params)
+    def activate(self):
+        """
+        Context manager making the client registry current, so that models
+        are looked up and created in it. Models go to the current registry
+        when the client has none.
+        """
+        if self.registry is None:
+            return nullcontext()
+        return self.registry.activate()
+
+    def _build(self, factory, records, batch_size=BATCH_SIZE):
+        records = iter(records)
+        while True:
+            batch = list(islice(records, batch_size))
+            if len(batch) == 0:
+                return
+            with self.activate():
+                objs = factory(batch)
+            yield from objs
+
+    @staticmethod
+    def _check_response(res, url, expected=(200,)):
         if res.status_code == 401:
             raise Exception(f"Authentication failed. Please check your token.")
         if res.status_code == 404:
             raise Exception(f"{url} not found.")
-        elif res.status_code != 200:
-            raise Exception(f"Request returned status {res.status_code}, {res.content}")
+        elif res.status_code not in expected:
+            raise Exception(
+                f"Request returned status {res.status_code}, {res.content}")
+        return res
+
+    def _send(self, method, url, timeout=None, **kwargs):
+        if timeout is None:
+            timeout = self.timeout
+        return self.session.request(method, url, timeout=timeout, **kwargs)
+
+    def request(self, url, query_params={}, timeout=None):
+        res = self._send('GET', url, params=query_params, timeout=timeout)
+        self._check_response(res, url)
         return res.json()
 
-    def request_csv(self, url, query_params={}):
-        headers = {'Authorization': f"Token {self.access_token}"}
-        # stream the file
-        with closing(requests.get(url, stream=True, 
-            headers=headers, params=query_params)) as res:
-            if res.status_code == 401:
-                raise Exception(f"Authentication failed. Please check your token.")
-            if res.status_code == 404:
-                raise Exception(f"{url} not found.")
-            elif res.status_code != 200:
-                raise Exception(f"Request returned status {res.status_code}")
-            root = zipfile.ZipFile(io.BytesIO(res.content))
-            f = root.namelist()
-            if len(f):
-                d = csv.DictReader(io.TextIOWrapper(root.open(f[0]), 'utf-8'))
-            else:
-                d = []
-            return d
+    def request_csv(self, url, query_params={}, timeout=None,
+                    chunk_size=CHUNK_SIZE, cache_key=None):
+        """
+        Download a zipped csv export and iterate over its rows.
+
+        The archive is spooled to a temporary file `chunk_size` bytes at a
+        time and the csv member is decompressed incrementally while
+        iterating, so memory usage doesn't grow with the size of the export.
+
+        When the client has a `cache` and a `cache_key` is given, the export
+        is revalidated with a conditional request and read from disk if the
+        server answers 304 Not Modified. If the entry was evicted in the
+        meantime, the export is downloaded again in full.
+
+        Parameters
+        ----------
+        cache_key: tuple
+            A `(task_id, endpoint)` pair identifying the export in the cache
+
+        Return
+        ------
+        An `ExportRows` iterator of rows as dicts
+        """
+        use_cache = self.cache is not None and cache_key is not None
+        if use_cache:
+            key = self.cache.key(*cache_key, api_url=self.api_url)
+        spool = None
+        # without a cache entry left to serve a 304, download it in full
+        for conditional in (True, False):
+            headers = {}
+            if use_cache and conditional:
+                headers = self.cache.headers(key)
+            try:
+                # stream the file
+                with closing(self._send('GET', url, stream=True,
+                                        params=query_params, headers=headers,
+                                        timeout=timeout)) as res:
+                    if len(headers) and res.status_code == 304:
+                        try:
+                            return self._iter_zipped_csv(self.cache.open(key))
+                        except KeyError:
+                            continue
+                    self._check_response(res, url)
+                    chunks = res.iter_content(chunk_size=chunk_size)
+                    etag = res.headers.get('ETag')
+                    last_modified = res.headers.get('Last-Modified')
+                    if use_cache and (etag or last_modified):
+                        key = self.cache.store(
+                            *cache_key, chunks, etag=etag,
+                            last_modified=last_modified, api_url=self.api_url)
+                        return self._iter_zipped_csv(self.cache.open(key))
+                    spool = tempfile.TemporaryFile()
+                    for chunk in chunks:
+                        spool.write(chunk)
+            except BaseException:
+                if spool is not None:
+                    spool.close()
+                raise
+            spool.seek(0)
+            return self._iter_zipped_csv(spool)
+
+    @staticmethod
+    def _iter_zipped_csv(spool):
+        return ExportRows(spool)
+
+    def paginate(self, url, query_params={}, page_size=1000, max_workers=None):
+        """
+        Iterate over every result of a paginated endpoint.
+
+        The first page gives the total `count`. The remaining pages are then
+        fetched in parallel, keeping at most `max_workers` requests in
+        flight, and their results are yielded lazily in page order. Endpoints
+        that don't report a `count` are walked sequentially through their
+        `next` links.
+
+        Parameters
+        ----------
+        url: str
+            The url of the endpoint
+        query_params: dict
+            Extra query parameters sent with every page request
+        page_size: int
+            The requested number of results per page. The server may cap it.
+        max_workers: int
+            The number of pages fetched concurrently, defaults to `pool_size`
+
+        Return
+        ------
+        A generator of results
+        """
+        if max_workers is None:
+            max_workers = self.pool_size
+        params = {**query_params, 'page_size': page_size}
+        res = self.request(url, params)
+        yield from res['results']
+        if not res.get('next'):
+            return
+        if 'count' not in res or len(res['results']) == 0:
+            next_url = res['next']
+            while next_url:
+                res = self.request(next_url)
+                next_url = res['next']
+                yield from res['results']
+            return
+        n_pages = math.ceil(res['count'] / len(res['results']))
+        pages = iter(range(2, n_pages + 1))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            def submit(page):
+                page_params = {**params, 'page': page}
+                return executor.submit(self.request, url, page_params)
+            pending = deque(
+                submit(page) for page in islice(pages, max_workers))
+            try:
+                while pending:
+                    res = pending.popleft().result()
+                    page = next(pages, None)
+                    if page is not None:
+                        pending.append(submit(page))
+                    yield from res['results']
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def request_all(self, url, query_params={}, page_size=1000,
+                    max_workers=None):
+        """Return the results of all the pages of a paginated endpoint."""
+        return list(self.paginate(url, query_params, page_size, max_workers))
 
     def get_corpora(self):
-        res = self.request(self.endpoints['corpora'])
+        url = f"{self.api_url}/{self.endpoints['corpora']}/"
+        res = self.request(url)
         corpora = []
         for js in res['results']:
             corpus_id = js['id']
@@ -76,6 +308,7 @@ class LinalgoClient:
             corpora.append(corpus)
         return corpora
 
+    @in_registry
     def get_corpus(self, corpus_id):
         url = f"{self.api_url}/{self.endpoints['corpora']}/{corpus_id}/"
         res = self.request(url)
@@ -85,47 +318,58 @@ class LinalgoClient:
         corpus.documents = documents
         return corpus
 
+    @in_registry
     def get_corpus_documents(self, corpus_id):
-        url = f"{self.api_url}/documents/?page_size=1000&corpus={corpus_id}"
-        res = self.request(url)
+        url = f"{self.api_url}/{self.endpoints['documents']}/"
         documents = []
-        for d in res['results']:
+        for d in self.paginate(url, {'corpus': corpus_id}):
             document = Document.from_dict(d)
             documents.append(document)
         return documents
 
     def get_tasks(self, task_ids=[]):
-        url = "tasks/"
-        tasks = []
-        res = self.request(url)
         if len(task_ids) == 0:
-            for js in res['results']:
-                task_ids.append(js['id'])
+            url = f"{self.api_url}/{self.endpoints['task']}/"
+            res = self.request(url)
+            task_ids = [js['id'] for js in res['results']]
+        tasks = []
         for task_id in task_ids:
             task = self.get_task(task_id)
-            tasks.extend(task)
+            tasks.append(task)
         return tasks
 
+    def _request_task_export(self, task_id, endpoint, since=None):
+        query_params = {'task_id': task_id, 'output_format': 'zip'}
+        if endpoint == 'documents-export':
+            query_params['only_documents'] = True
+        # incremental exports are not cached
+        cache_key = (task_id, endpoint)
+        if since is not None:
+            query_params['since'] = since.isoformat()
+            cache_key = None
+        api_url = "{}/{}/".format(self.api_url, self.endpoints[endpoint])
+        return self.request_csv(api_url, query_params, cache_key=cache_key)
+
+    def iter_task_documents(self, task_id, since=None):
+        """Stream the documents of a task from its csv export."""
+        records = self._request_task_export(
+            task_id, 'documents-export', since=since)
+        return self._build(Document.from_records, records)
+
+    def iter_task_annotations(self, task_id, since=None):
+        """Stream the annotations of a task from its csv export."""
+        records = self._request_task_export(
+            task_id, 'annotations-export', since=since)
+        return self._build(Annotation.from_records,
+                           (row for row in records if not row.get('deleted')))
+
     def get_task_documents(self, task_id):
-        query_params = {
-            'task_id': task_id,
-            'output_format': 'zip',
-            'only_documents': True
-        }
-        api_url = "{}/{}/".format(
-            self.api_url, self.endpoints['documents-export'])
-        records = self.request_csv(api_url, query_params)
-        data = [Document.from_dict(row) for row in records]
-        return data
+        return list(self.iter_task_documents(task_id))
 
     def get_task_annotations(self, task_id):
-        query_params = {'task_id': task_id, 'output_format': 'zip'}
-        api_url = "{}/{}/".format(
-            self.api_url, self.endpoints['annotations-export'])
-        records = self.request_csv(api_url, query_params)
-        data = [Annotation.from_dict(row) for row in records]
-        return data
+        return list(self.iter_task_annotations(task_id))
 
+    @in_registry
     def get_task(self, task_id, verbose=False):
         task_url = "{}/{}/{}/".format(
             self.api_url, self.endpoints['task'], task_id)
@@ -140,12 +384,9 @@ class LinalgoClient:
             print(f'({len(task.annotators)} found)')
         if verbose:
             print('Retrieving entities...', end=' ')
-        params = {'tasks': task.id, 'page_size': 1000}
+        task.entities = self.get_entities(task_id)
         if verbose:
             print(f'({len(task.entities)} found)')
-        entities_url = "{}/{}".format(self.api_url, self.endpoints['entities'])
-        entities_json = self.request(entities_url, params)
-        task.entities = [Entity.from_dict(e) for e in entities_json['results']]
         if verbose:
             print('Retrieving documents...', end=' ')
         task.documents = self.get_task_documents(task_id)
@@ -156,15 +397,93 @@ class LinalgoClient:
         task.annotations = self.get_task_annotations(task_id)
         if verbose:
             print(f'({len(task.annotations)} found)')
+        self.sync_marks[task.id] = max(
+            (a.created for a in task.annotations), default=None)
         return task
 
+    @in_registry
+    def sync_task(self, task, verbose=False):
+        """
+        Merge into `task` the documents and annotations created, changed or
+        deleted on the hub since it was last retrieved or synced.
+
+        The high-water mark is the latest `created` timestamp seen for the
+        task, and only the export rows at or after it are downloaded. Updated
+        annotations are modified in place through the registry, and
+        annotations flagged as `deleted` are removed from the task, their
+        document and the registry. Tasks that were never retrieved by this
+        client are fully downloaded on their first sync.
+
+        Parameters
+        ----------
+        task: Task
+            The task to update
+
+        Return
+        ------
+        The updated task
+        """
+        since = self.sync_marks.get(task.id)
+        doc_ids = {d.id for d in task.documents}
+        n_docs = 0
+        for document in self.iter_task_documents(task.id, since=since):
+            if document.id not in doc_ids:
+                doc_ids.add(document.id)
+                task.documents.append(document)
+                n_docs += 1
+        annotation_ids = {a.id for a in task.annotations}
+        mark, n_created, n_updated, deleted = since, 0, 0, set()
+        records = self._request_task_export(
+            task.id, 'annotations-export', since=since)
+
+        def live(records):
+            for row in records:
+                if row.get('deleted'):
+                    deleted.add(row['id'])
+                else:
+                    yield row
+        for annotation in self._build(Annotation.from_records, live(records)):
+            if annotation.id in annotation_ids:
+                n_updated += 1
+            else:
+                annotation_ids.add(annotation.id)
+                task.annotations.append(annotation)
+                n_created += 1
+            if mark is None or annotation.created > mark:
+                mark = annotation.created
+        if len(deleted):
+            self._remove_annotations(task, deleted)
+        self.sync_marks[task.id] = mark
+        if verbose:
+            print(f'{n_docs} new documents, {n_created} new annotations, '
+                  f'{n_updated} updated, {len(deleted)} deleted')
+        return task
+
+    @staticmethod
+    def _remove_annotations(task, annotation_ids):
+        removed = [a for a in task.annotations if a.id in annotation_ids]
+        task.annotations[:] = [
+            a for a in task.annotations if a.id not in annotation_ids]
+        for document in {a.document for a in removed}:
+            document.annotations[:] = [
+                a for a in document.annotations if a.id not in annotation_ids]
+        for annotation in removed:
+            annotation.unregister()
+
+    @in_registry
+    def get_entities(self, task_id):
+        params = {'tasks': task_id}
+        entities_url = "{}/{}".format(self.api_url, self.endpoints['entities'])
+        return [Entity.from_dict(e)
+                for e in self.paginate(entities_url, params)]
+
+    @in_registry
     def get_annotators(self, task=None):
-        params = {'tasks': task.id, 'page_size': 1000}
+        params = {'tasks': task.id}
         annotators_url = "{}/{}/".format(
             self.api_url, self.endpoints['annotators'])
-        res = self.request(annotators_url, params)
         annotators = []
-        for a in res['results']:
+        for a in self.paginate(annotators_url, params):
             annotator = Annotator.from_dict(a)
             annotators.append(annotator)
         return annotators
@@ -172,23 +491,19 @@ class LinalgoClient:
     def create_annotator(self, annotator):
         if annotator.annotator_id is not None:
             raise Exception("Annotator already has an ID.")
-        annotator_url = "{}/{}/".format(
-            self.api_url, self.endpoints['annotators'])
-        url = self.api_url + annotator_url
-        headers = { 'Authorization': f"Token {self.access_token}"}
+        url = "{}/{}/".format(self.api_url, self.endpoints['annotators'])
         annotator_json = {
             'name': annotator.name,
             'model': str(annotator.model)
         }
-        res = requests.post(url, json=annotator_json, headers=headers).json()
+        res = self._send('POST', url, json=annotator_json).json()
         annotator.annotator_id = res['id']
         annotator.owner = res['owner']
         return annotator
 
     def create_annotations(self, annotations):
         url = "{}/{}/".format(self.api_url, self.endpoints['annotations'])
-        headers = {'Authorization': f"Token {self.access_token}"}
-        res = requests.post(url, json=annotations, headers=headers)
+        res = self._send('POST', url, json=annotations)
         return res
 
     def assign(self, document, annotator, task, reviewee=None,
@@ -201,23 +516,133 @@ class LinalgoClient:
             'task': task,
             'reviewee': reviewee
         }
-        url = self.api_url + '/document-status/'
-        headers = {'Authorization': f"Token {self.access_token}"}
-        res = requests.post(url, doc_status, headers=headers)
+        url = "{}/{}/".format(self.api_url, self.endpoints['document-status'])
+        res = self._send('POST', url, data=doc_status)
         return res
 
     def unassign(self, status_id):
-        headers = {'Authorization': f"Token {self.access_token}"}
-        url = "{}/{}/{}/".format(self.api_url, '/document-status/', status_id)
-        res = requests.delete(url, headers=headers)
+        url = "{}/{}/{}/".format(
+            self.api_url, self.endpoints['document-status'], status_id)
+        res = self._send('DELETE', url)
         return res
 
-    def get_schedule(self, task):
-        query_params = {'task': task.id, 'page_size': 1000}
-        docs = []
-        next_url = "{}/{}/".format(self.api_url, '/document-status/')
-        while next_url:
-            res = self.request(next_url, query_params=query_params)
-            next_url = res['next']
-            docs.extend(res['results'])
-        return docs
+    def assign_many(self, assignments, task,
+                    assignment_type=AssignmentType.LABEL.value, schedule=None,
+                    max_workers=None, dry_run=False):
+        """
+        Assign many documents to many annotators over the pooled session.
+
+        Parameters
+        ----------
+        assignments: Dict[str, Iterable[str]]
+            Maps annotator ids to the document ids to assign them, e.g. the
+            sets returned by `Scheduler.random_assign`. For reviews, keys are
+            `(reviewer_id, reviewee_id)` pairs and values are the sets
+            returned by `Scheduler.random_review`.
+        task: uuid
+            The uuid of the task
+        assignment_type: str
+            An `AssignmentType` value
+        schedule: list
+            The document statuses returned by `get_schedule`. Documents
+            already assigned to or completed by an annotator are skipped,
+            reviews only when they are of the same reviewee.
+        max_workers: int
+            Number of concurrent requests, defaults to `pool_size`
+        dry_run: bool
+            List the document statuses that would be created in the
+            `planned` attribute of the report without sending anything
+
+        Return
+        ------
+        A `BulkReport` whose `succeeded` attribute lists the created status
+        ids in request order and whose `failed` attribute maps the
+        `(document, key)` pairs that could not be assigned to their error,
+        where `key` is the key of `assignments`.
+        """
+        existing = set()
+        if schedule is not None:
+            active = (AssignmentStatus.ASSIGNED.value,
+                      AssignmentStatus.COMPLETED.value)
+            existing = {(s['document'], s['annotator'], s['type'],
+                         s.get('reviewee'))
+                        for s in schedule if s['status'] in active}
+        doc_statuses, keys = [], []
+        for key, documents in assignments.items():
+            annotator, reviewee = key if type(key) == tuple else (key, None)
+            for document in documents:
+                if (document, annotator, assignment_type,
+                        reviewee) in existing:
+                    continue
+                keys.append((document, key))
+                doc_statuses.append({
+                    'status': AssignmentStatus.ASSIGNED.value,
+                    'type': assignment_type,
+                    'document': document,
+                    'annotator': annotator,
+                    'task': task,
+                    'reviewee': reviewee
+                })
+        if dry_run:
+            report = BulkReport()
+            report.planned = doc_statuses
+            return report
+        url = "{}/{}/".format(self.api_url, self.endpoints['document-status'])
+
+        def send(doc_status):
+            return self._send('POST', url, data=doc_status)
+
+        return self._send_many(send, doc_statuses, keys,
+                               lambda item, res: res.json()['id'], max_workers)
+
+    def unassign_many(self, status_ids, max_workers=None, dry_run=False):
+        """
+        Delete many document statuses over the pooled session.
+
+        Return
+        ------
+        A `BulkReport` whose `succeeded` attribute lists the deleted status
+        ids. With `dry_run`, its `planned` attribute lists the status ids to
+        delete.
+        """
+        status_ids = list(status_ids)
+        if dry_run:
+            report = BulkReport()
+            report.planned = status_ids
+            return report
+        return self._send_many(self.unassign, status_ids, status_ids,
+                               lambda item, res: item, max_workers)
+
+    def _send_many(self, send, items, keys, result, max_workers=None):
+        if max_workers is None:
+            max_workers = self.pool_size
+        report = BulkReport()
+        start = time.time()
+
+        def call(item):
+            try:
+                return send(item)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for key, item, res in zip(keys, items, executor.map(call, items)):
+                report.n_requests += 1
+                if isinstance(res, Exception):
+                    report.failed[key] = str(res)
+                elif res.status_code < 300:
+                    try:
+                        report.succeeded.append(result(item, res))
+                    except (ValueError, KeyError) as e:
+                        report.failed[key] = \
+                            f'unexpected response: {res.text!r} ({e!r})'
+                else:
+                    report.failed[key] = \
+                        f'status {res.status_code}: {res.text}'
+        report.elapsed = time.time() - start
+        return report
+
+    def get_schedule(self, task, max_workers=None):
+        url = "{}/{}/".format(self.api_url, self.endpoints['document-status'])
+        return self.request_all(
+            url, {'task': task.id}, max_workers=max_workers)
@@ -1,8 +1,10 @@
-import numpy as np
-
-from django.utils.dateparse import parse_datetime
+from typing import Dict, Iterable, Tuple, Union
 
+import numpy as np
+import pandas as pd
 
+from linalgo.annotate.store import NAT, AnnotationStore, Interner, \
+    _timestamp, parse_timestamps
 from linalgo.hub.client import AssignmentStatus
 
 
@@ -14,33 +16,408 @@ class NotEnoughReviews(Exception):
     pass
 
 
+def _bitsets(rows, cols, n_rows, n_cols):
+    """Pack `(row, col)` pairs into one bitset of `n_cols` bits per row."""
+    bits = np.zeros((n_rows, (n_cols + 7) // 8), dtype=np.uint8)
+    cols = np.asarray(cols, dtype=np.int64)
+    np.bitwise_or.at(bits, (np.asarray(rows, dtype=np.int64), cols >> 3),
+                     (0x80 >> (cols & 7)).astype(np.uint8))
+    return bits
+
+
+def _members(bits, n):
+    """Positions of the bits set in a bitset of `n` bits."""
+    return np.flatnonzero(np.unpackbits(bits, count=n))
+
+
+def _has(bits, positions):
+    """Whether the bits at `positions` are set."""
+    return (bits[positions >> 3] >> (7 - (positions & 7))) & 1 == 1
+
+
+class PriorityTree:
+    """
+    Sum tree over the non-negative priorities of positions `0..n-1`.
+
+    Updating a priority and drawing a position with probability proportional
+    to its priority both cost O(log n), so that drawing `k` positions without
+    replacement costs O(k log n).
+    """
+
+    def __init__(self, capacity=1):
+        self.capacity = 1
+        self.tree = np.zeros(2, dtype=np.float64)
+        self.reserve(capacity)
+
+    @property
+    def total(self):
+        return self.tree[1]
+
+    def reserve(self, capacity):
+        if capacity <= self.capacity:
+            return
+        new_capacity = max(2 * self.capacity,
+                           1 << int(capacity - 1).bit_length())
+        tree = np.zeros(2 * new_capacity, dtype=np.float64)
+        tree[new_capacity:new_capacity + self.capacity] = \
+            self.tree[self.capacity:]
+        self.capacity, self.tree = new_capacity, tree
+        lo = new_capacity // 2
+        while lo >= 1:
+            tree[lo:2 * lo] = tree[2 * lo:4 * lo:2] + tree[2 * lo + 1:4 * lo:2]
+            lo //= 2
+
+    def get(self, positions):
+        return self.tree[self.capacity + np.asarray(positions, dtype=np.int64)]
+
+    def update(self, positions, priorities):
+        """Set the priorities of `positions`, the last one wins."""
+        positions = np.asarray(positions, dtype=np.int64)
+        if len(positions) == 0:
+            return
+        if np.any(np.asarray(priorities) < 0):
+            raise ValueError('Priorities must be non-negative.')
+        self.reserve(positions.max() + 1)
+        nodes = self.capacity + positions
+        self.tree[nodes] = priorities
+        nodes = np.unique(nodes >> 1)
+        while nodes[-1] >= 1:
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+            nodes = np.unique(nodes >> 1)
+
+    def _find(self, u):
+        tree, i = self.tree, 1
+        while i < self.capacity:
+            left = tree[2 * i]
+            if u < left:
+                i = 2 * i
+            else:
+                u -= left
+                i = 2 * i + 1
+        return i - self.capacity
+
+    def sample(self, k, accept=None, max_draws=None):
+        """
+        Draw up to `k` distinct positions with probability proportional to
+        their priority, among the ones `accept` returns true for.
+
+        Return
+        ------
+        The drawn positions. Fewer than `k` are returned when the accepted
+        positions with a positive priority run out or when `max_draws` draws
+        were rejected.
+        """
+        drawn, removed = [], []
+        rejected = 0
+        try:
+            while len(drawn) < k and self.total > 0:
+                position = self._find(np.random.random_sample() * self.total)
+                priority = self.tree[self.capacity + position]
+                if priority <= 0:
+                    # rounding error at a boundary, draw again
+                    continue
+                removed.append((position, priority))
+                self.update([position], [0.])
+                if accept is None or accept(position):
+                    drawn.append(position)
+                else:
+                    rejected += 1
+                    if max_draws is not None and rejected >= max_draws:
+                        break
+        finally:
+            if len(removed):
+                positions, priorities = zip(*removed)
+                self.update(positions, priorities)
+        return np.array(drawn, dtype=np.int64)
+
+
+def _ns(value):
+    if type(value) == str:
+        return parse_timestamps([value])[0]
+    return _timestamp(value)
+
+
 class Scheduler:
+    """
+    Pick the documents to assign to, or have reviewed by, the annotators of a
+    task.
+
+    Documents and annotators are interned into integer codes, and the
+    documents completed or pending for each annotator are kept as packed
+    bitsets, so that every query is a few vectorized operations over
+    `n_documents / 8` bytes. `update` applies schedule changes in place at a
+    cost proportional to the change.
+
+    Parameters
+    ----------
+    task: Task
+        The task to schedule
+    schedule: pd.DataFrame
+        The document statuses of the task, as returned by
+        `LinalgoClient.get_schedule`, with `id`, `document`, `annotator`,
+        `status` and `timestamp` columns
+    """
 
-    def __init__(self, task, schedule):
+    columns = ('document', 'annotator', 'status', 'timestamp')
+
+    def __init__(self, task, schedule=()):
         self.task = task
-        self.schedule = schedule
-        self.schedule['timestamp'] = schedule['timestamp'].apply(parse_datetime)
+        self.documents = Interner()
+        self.annotators = Interner(a.id for a in task.annotators)
+        self.annotator_ids = set(self.annotators.values)
+        # status ids, interned in the order of the rows they are stored in
+        self.statuses = Interner()
+        self.n_rows = 0
+        self.doc = np.zeros(0, dtype=np.int32)
+        self.annotator = np.zeros(0, dtype=np.int32)
+        self.completed = np.zeros(0, dtype=bool)
+        self.assigned = np.zeros(0, dtype=bool)
+        self.timestamp = np.zeros(0, dtype=np.int64)
+        self.task_docs = np.zeros(0, dtype=np.uint8)
+        self.annotated = np.zeros(0, dtype=np.uint8)
+        self.seen = np.zeros((len(self.annotators), 0), dtype=np.uint8)
+        self.pending = np.zeros((len(self.annotators), 0), dtype=np.uint8)
+        # number of statuses behind each (annotator, document) bit
+        self._seen_counts = {}
+        self._pending_counts = {}
+        # annotator code -> completion timestamps and documents, by time
+        self._completions = {}
+        self.priorities = PriorityTree()
+        self.update(
+            schedule, documents=(doc.id for doc in task.documents),
+            annotated=(a.document.id for a in task.annotations
+                       if a.document is not None))
 
-    def unseen_documents(self, n):
+    def update(self, statuses=(), unassigned=(), documents=(), annotated=()):
         """
+        Apply changes of the schedule.
+
         Parameters
         ----------
+        statuses: Union[pd.DataFrame, Iterable[dict]]
+            New document statuses, or existing ones whose status changed,
+            identified by their `id`
+        unassigned: Iterable[str]
+            The ids of deleted document statuses
+        documents: Iterable[str]
+            The ids of documents added to the task
+        annotated: Iterable[str]
+            The ids of documents that received annotations
+        """
+        codes = self.documents.encode(documents)
+        codes = codes[codes >= 0]
+        self._resize()
+        self.task_docs |= _bitsets(np.zeros(len(codes)), codes, 1,
+                                   len(self.task_docs) * 8)[0]
+        codes = self.documents.encode(annotated)
+        codes = codes[codes >= 0]
+        self._resize()
+        self.annotated |= _bitsets(np.zeros(len(codes)), codes, 1,
+                                   len(self.annotated) * 8)[0]
+        if not isinstance(statuses, pd.DataFrame):
+            statuses = pd.DataFrame(list(statuses))
+        if len(statuses):
+            self._update_statuses(statuses)
+        codes = self.statuses.lookup(unassigned)
+        codes = np.unique(codes[codes >= 0])
+        # ids can be repeated or already unassigned
+        codes = codes[self.completed[codes] | self.assigned[codes]]
+        self._count(codes, -1)
+        self.completed[codes] = False
+        self.assigned[codes] = False
 
-        n: int
-            Number of unseen documents to return
+    def _update_statuses(self, statuses):
+        if 'id' in statuses:
+            ids = statuses['id'].to_numpy(dtype=object).copy()
+        else:
+            ids = np.full(len(statuses), None, dtype=object)
+        # statuses without an id are always new
+        for j, i in enumerate(np.flatnonzero(pd.isna(ids))):
+            ids[i] = ('row', self.n_rows + j)
+        keep = ~pd.Series(ids).duplicated(keep='last').to_numpy()
+        statuses, ids = statuses[keep], ids[keep]
+        rows = self.statuses.encode(ids).astype(np.int64)
+        old = rows[rows < self.n_rows]
+        self._count(old[self.completed[old] | self.assigned[old]], -1)
+        self._reserve(len(self.statuses))
+        self.n_rows = len(self.statuses)
+        status = statuses['status'].to_numpy()
+        self.doc[rows] = self.documents.encode(statuses['document'])
+        self.annotator[rows] = self.annotators.encode(statuses['annotator'])
+        # statuses missing their document or annotator are left out
+        valid = (self.doc[rows] >= 0) & (self.annotator[rows] >= 0)
+        self.completed[rows] = valid & \
+            (status == AssignmentStatus.COMPLETED.value)
+        self.assigned[rows] = valid & \
+            (status == AssignmentStatus.ASSIGNED.value)
+        if 'timestamp' in statuses:
+            self.timestamp[rows] = parse_timestamps(statuses['timestamp'])
+        else:
+            self.timestamp[rows] = NAT
+        self._resize()
+        self._count(rows, 1)
+
+    def _reserve(self, n_rows):
+        capacity = len(self.doc)
+        if n_rows <= capacity:
+            return
+        capacity = max(n_rows, 2 * capacity)
+        for name in ('doc', 'annotator', 'completed', 'assigned', 'timestamp'):
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
+
+    def _resize(self):
+        """Grow the bitsets to the interned documents and annotators."""
+        n_bytes = len(self.task_docs)
+        if len(self.documents) > 8 * n_bytes:
+            n_bytes = max((len(self.documents) + 7) // 8, 2 * n_bytes)
+        shape = (len(self.annotators), n_bytes)
+        for name in ('task_docs', 'annotated', 'seen', 'pending'):
+            bits = getattr(self, name)
+            if bits.shape[-1] == n_bytes and \
+                    (bits.ndim == 1 or bits.shape[0] == shape[0]):
+                continue
+            grown = np.zeros(n_bytes if bits.ndim == 1 else shape,
+                             dtype=np.uint8)
+            if bits.ndim == 1:
+                grown[:len(bits)] = bits
+            else:
+                grown[:bits.shape[0], :bits.shape[1]] = bits
+            setattr(self, name, grown)
+
+    def _count(self, rows, sign):
+        """Add or remove the statuses of `rows` from the bitsets."""
+        for annotator in np.unique(self.annotator[rows]).tolist():
+            self._completions.pop(annotator, None)
+        for active, counts, bits in (
+                (self.completed, self._seen_counts, self.seen),
+                (self.assigned, self._pending_counts, self.pending)):
+            r = rows[active[rows]]
+            if len(r) == 0:
+                continue
+            keys, n = np.unique(
+                (self.annotator[r].astype(np.int64) << 32) | self.doc[r],
+                return_counts=True)
+            keys = keys.tolist()
+            if len(counts):
+                before = np.fromiter((counts.get(k, 0) for k in keys),
+                                     dtype=np.int64, count=len(keys))
+            else:
+                before = np.zeros(len(keys), dtype=np.int64)
+            after = before + sign * n
+            counts.update(zip(keys, after.tolist()))
+            for k in np.array(keys)[after == 0].tolist():
+                del counts[k]
+            # flip the bits of the pairs gaining their first or losing their
+            # last status
+            flip = np.array(keys, dtype=np.int64)
+            flip = flip[(before == 0) != (after == 0)]
+            docs = flip & 0xffffffff
+            np.bitwise_xor.at(bits, (flip >> 32, docs >> 3),
+                              (0x80 >> (docs & 7)).astype(np.uint8))
+
+    def _code(self, annotator_id):
+        if annotator_id not in self.annotator_ids:
+            raise AnnotatorNotFound(
+                '{} is not a known annotator'.format(annotator_id))
+        return self.annotators.index[annotator_id]
+
+    def _sample(self, bits, n, weighted=False):
+        if weighted and n is not None:
+            return self._weighted_sample(bits, n)
+        pool = _members(bits, len(self.documents))
+        if n is None:
+            return set(self.documents.decode(pool))
+        if n > len(pool):
+            raise NotEnoughReviews(
+                f'{n} documents requested, {len(pool)} available')
+        codes = np.random.choice(pool, size=n, replace=False)
+        return set(self.documents.decode(codes))
+
+    def _weighted_sample(self, bits, n):
+        codes = self.priorities.sample(
+            n, accept=lambda d: _has(bits, d), max_draws=4 * n + 64)
+        if len(codes) < n:
+            # most of the priority mass is outside the pool: draw from the
+            # pool directly, then complete uniformly with unprioritized ones
+            pool = _members(bits, len(self.documents))
+            if n > len(pool):
+                raise NotEnoughReviews(
+                    f'{n} documents requested, {len(pool)} available')
+            self.priorities.reserve(len(self.documents))
+            weights = self.priorities.get(pool)
+            positive = pool[weights > 0]
+            size = min(n, len(positive))
+            codes = np.random.choice(
+                positive, size=size, replace=False,
+                p=weights[weights > 0] / weights[weights > 0].sum()) \
+                if size else positive[:0]
+            codes = np.concatenate([codes, np.random.choice(
+                pool[weights <= 0], size=n - size, replace=False)])
+        return set(self.documents.decode(codes))
+
+    def set_priorities(self, document_ids, priorities):
         """
-        annotated_docs = set(
-            annotation.to_json()['document'] for annotation in self.task.annotations)
-        docs = set(doc.id for doc in self.task.documents)
-        new_docs = list(docs - annotated_docs)
+        Set the sampling priorities of documents for the `weighted` mode of
+        `unseen_documents`, `random_assign` and `random_review`.
 
-        if len(new_docs) < n:
-            raise NotEnoughReviews()
+        Parameters
+        ----------
+        document_ids: Iterable[str]
+            The ids of the documents
+        priorities: Iterable[float]
+            Non-negative priorities, documents without one have priority 0
+        """
+        codes = self.documents.encode(list(document_ids))
+        priorities = np.asarray(priorities, dtype=np.float64)
+        self._resize()
+        self.priorities.reserve(len(self.documents))
+        self.priorities.update(codes[codes >= 0], priorities[codes >= 0])
+
+    def prioritize_uncertainty(self, annotations, threshold=0.):
+        """
+        Prioritize documents by the uncertainty of model annotations, i.e.
+        `1 / (1 + |score - threshold|)`, using the last scored annotation of
+        each document.
+        """
+        scores = {a.document.id: a.score for a in annotations
+                  if getattr(a, 'score', None) is not None and
+                  a.document is not None}
+        uncertainty = 1 / (1 + np.abs(
+            np.fromiter(scores.values(), dtype=np.float64, count=len(scores))
+            - threshold))
+        self.set_priorities(list(scores), uncertainty)
 
-        return set(np.random.choice(new_docs, size=n, replace=False))
+    def prioritize_disagreement(self, annotations):
+        """
+        Prioritize documents by the disagreement of their annotators, i.e.
+        one minus the agreement ratio of a majority vote.
+        """
+        store = AnnotationStore.from_annotations(annotations)
+        winners, agreement = store.vote()
+        self.set_priorities(winners.decode('document'), 1 - agreement)
+
+    def unseen_documents(self, n=None, weighted=False):
+        """
+        Parameters
+        ----------
+
+        n: int
+            Number of unseen documents to return, all of them by default
+        weighted: bool
+            Draw documents with probability proportional to their priority,
+            see `set_priorities`
+
+        Return
+        ------
+        A set of unseen documents
+        """
+        return self._sample(self.task_docs & ~self.annotated, n, weighted)
 
     def random_review(self, reviewer_id, reviewee_id, n=None, start_date=None,
-                      end_date=None):
+                      end_date=None, strata=None, weighted=False):
         """
         Parameters
         ----------
@@ -49,45 +426,116 @@ class Scheduler:
         reviewee_id: uuid
             The uuid of the reviewee
         n: int
-            The number of documents to review
+            The number of documents to review, all of them by default
         start_date:
             Filter reviewee annotations after `start_date`
         end_date:
-            Filters reviewee annotations after `end_date`
+            Filters reviewee annotations before `end_date`
+        strata: int
+            Split the window in `strata` periods of equal length and draw
+            the documents evenly from each period. Like with dates,
+            completions without a timestamp are left out.
+        weighted: bool
+            Draw documents with probability proportional to their priority,
+            see `set_priorities`. Ignored with `strata`.
 
         Return
         ------
         A set of documents to review
         """
-        schedule = self.schedule
+        reviewer, reviewee = self._code(reviewer_id), self._code(reviewee_id)
+        reviewer_docs = self.seen[reviewer] | self.pending[reviewer]
+        if strata is not None:
+            return self._stratified_review(reviewer_docs, reviewee, n,
+                                           start_date, end_date, strata)
+        if start_date is None and end_date is None:
+            reviewee_docs = self.seen[reviewee]
+        else:
+            _, docs = self._window(reviewee, start_date, end_date)
+            reviewee_docs = _bitsets(np.zeros(len(docs)), docs, 1,
+                                     len(self.task_docs) * 8)[0]
+        return self._sample(reviewee_docs & ~reviewer_docs, n, weighted)
+
+    def _window(self, annotator, start_date=None, end_date=None):
+        """
+        The documents completed by an annotator in a time window.
+
+        Completions are kept sorted by time for each annotator, so that a
+        window is found with a binary search. Completions without a
+        timestamp are left out.
+
+        Parameters
+        ----------
+        annotator: int
+            The code of the annotator
+        start_date:
+            Keep completions from `start_date` on
+        end_date:
+            Keep completions before `end_date`
+
+        Return
+        ------
+        A tuple `(timestamps, documents)` of arrays sorted by timestamp
+        """
+        index = self._completions.get(annotator)
+        if index is None:
+            n = self.n_rows
+            rows = np.flatnonzero(
+                (self.annotator[:n] == annotator) & self.completed[:n] &
+                (self.timestamp[:n] != NAT))
+            rows = rows[np.argsort(self.timestamp[rows], kind='stable')]
+            index = self.timestamp[rows], self.doc[rows]
+            self._completions[annotator] = index
+        timestamps, docs = index
+        lo, hi = 0, len(timestamps)
         if start_date is not None:
-            idx = (schedule['annotator'] == reviewee_id) & schedule['timestamp']
-            schedule = schedule[idx]
+            lo = np.searchsorted(timestamps, _ns(start_date), side='left')
         if end_date is not None:
-            idx = (schedule['annotator'] == reviewee_id) & schedule['timestamp']
-            schedule = schedule[idx]
-        if (reviewer_id not in {a.id for a in self.task.annotators} or
-            reviewee_id not in {a.id for a in self.task.annotators}):
-            raise AnnotatorNotFound()
-        reviewer_idx = schedule['annotator'] == reviewer_id
-        reviewee_idx = schedule['annotator'] == reviewee_id
-        seen_idx = schedule['status'] == AssignmentStatus.COMPLETED.value
-        pending_idx = schedule['status'] == AssignmentStatus.ASSIGNED.value
-
-        idx = reviewer_idx & (seen_idx | pending_idx)
-        reviewer_docs = set(schedule.loc[idx, 'document'])
-        idx = reviewee_idx & seen_idx
-        reviewee_docs = set(schedule.loc[idx, 'document'])
-
-        pool = list(reviewee_docs - reviewer_docs)
-        if n is not None:
-            if n > len(pool):
-                print(pool)
-                raise NotEnoughReviews()
-            return set(np.random.choice(pool, size=n, replace=False))
-        return pool
+            hi = np.searchsorted(timestamps, _ns(end_date), side='left')
+        return timestamps[lo:hi], docs[lo:hi]
 
-    def random_assign(self, assignee_id, n):
+    def _stratified_review(self, reviewer_docs, reviewee, n, start_date,
+                           end_date, strata):
+        timestamps, docs = self._window(reviewee, start_date, end_date)
+        # drop the documents the reviewer already has, and keep the latest
+        # completion of documents completed more than once
+        busy = (reviewer_docs[docs >> 3] >> (7 - (docs & 7))) & 1
+        timestamps, docs = timestamps[busy == 0], docs[busy == 0]
+        _, last = np.unique(docs[::-1], return_index=True)
+        keep = np.sort(len(docs) - 1 - last)
+        timestamps, docs = timestamps[keep], docs[keep]
+        if n is None:
+            n = len(docs)
+        if n > len(docs):
+            raise NotEnoughReviews(
+                f'{n} documents requested, {len(docs)} available')
+        if n == 0:
+            return set()
+        start = _ns(start_date) if start_date is not None else timestamps[0]
+        end = _ns(end_date) if end_date is not None else timestamps[-1] + 1
+        width = max((end - start) / strata, 1)
+        buckets = np.clip(((timestamps - start) // width).astype(np.int64),
+                          0, strata - 1)
+        sizes = np.bincount(buckets, minlength=strata)
+        # spread the draws evenly over the buckets, giving what a small
+        # bucket cannot take to the others
+        quotas = np.zeros(strata, dtype=np.int64)
+        left = n
+        while left > 0:
+            open_ = np.flatnonzero(quotas < sizes)
+            share = np.full(len(open_), left // len(open_))
+            share[np.random.permutation(len(open_))[:left % len(open_)]] += 1
+            share = np.minimum(share, sizes[open_] - quotas[open_])
+            quotas[open_] += share
+            left -= share.sum()
+        order = np.argsort(buckets, kind='stable')
+        offsets = np.concatenate([[0], np.cumsum(sizes)])
+        chosen = [np.random.choice(order[offsets[b]:offsets[b + 1]],
+                                   size=quotas[b], replace=False)
+                  for b in np.flatnonzero(quotas)]
+        return set(self.documents.decode(docs[np.concatenate(chosen)]))
+
+    def random_assign(self, assignee_id, n=None, weighted=False):
         """
 
         Parameters
@@ -96,33 +544,90 @@ class Scheduler:
         assignee_id: uuid
             The uuid of the annotator
         n: int
-            the number of documents
+            the number of documents, all the assignable ones by default
+        weighted: bool
+            Draw documents with probability proportional to their priority,
+            see `set_priorities`
 
         Return
         ------
         A set of documents to assign
         """
+        assignee = self._code(assignee_id)
+        assignee_docs = self.seen[assignee] | self.pending[assignee]
+        return self._sample(
+            self.task_docs & ~self.annotated & ~assignee_docs, n, weighted)
 
-        if assignee_id not in {a.id for a in self.task.annotators}:
-            raise AnnotatorNotFound(
-                '{} is not a known annotator'.format(assignee_id))
-
-        all_docs = set(doc.id for doc in self.task.documents)
-        all_seen_docs = set()
-        for annotation in self.task.annotations:
-            all_seen_docs.add(annotation.to_json()['document'])
-        all_new_docs = all_docs - all_seen_docs
-
-        assignee_idx = self.schedule['annotator'] == assignee_id
-        seen_idx = self.schedule['status'] == AssignmentStatus.COMPLETED.value
-        pending_idx = self.schedule['status'] == AssignmentStatus.ASSIGNED.value
+    def plan(self, quotas: Union[int, Dict[str, int]], overlap: int = 1,
+             reviews: Iterable[Tuple[str, str, int]] = (), seed=None):
+        """
+        Plan the assignments of a whole scheduling round at once.
 
-        idx = assignee_idx & (seen_idx | pending_idx)
-        assignee_docs = set(self.schedule.loc[idx, 'document'])
+        Labeling assignments are drawn from the documents of the task that
+        nobody annotated, was assigned or completed yet. Each drawn document
+        goes to `overlap` distinct annotators, or fewer when a quota exceeds
+        the number of drawn documents. Reviews are drawn as with
+        `random_review`, and never give a reviewer the same document twice.
 
-        pool = list(all_new_docs - assignee_docs)
-        if n > len(pool):
-            print(pool)
-            raise NotEnoughReviews()
-        return set(np.random.choice(pool, size=n, replace=False))
+        Parameters
+        ----------
+        quotas: Union[int, Dict[str, int]]
+            The number of documents to assign to each annotator id, or to
+            every annotator of the task
+        overlap: int
+            The number of annotators per document
+        reviews: Iterable[Tuple[str, str, int]]
+            `(reviewer_id, reviewee_id, n)` triples
+        seed:
+            Seed of the random generator
 
+        Return
+        ------
+        A tuple `(assignments, reviews)` of dicts mapping annotator ids, and
+        `(reviewer_id, reviewee_id)` pairs, to lists of document ids, as
+        expected by `LinalgoClient.assign_many`
+        """
+        rng = np.random.default_rng(seed)
+        if type(quotas) == int:
+            quotas = {a: quotas for a in self.annotators.values
+                      if a in self.annotator_ids}
+        codes = np.array([self._code(a) for a in quotas], dtype=np.int64)
+        counts = np.array(list(quotas.values()), dtype=np.int64)
+        n_docs = len(self.documents)
+        assignments = {}
+        if counts.sum() > 0:
+            busy = np.bitwise_or.reduce(self.seen | self.pending, axis=0) \
+                if len(self.seen) else np.zeros_like(self.task_docs)
+            pool = _members(self.task_docs & ~self.annotated & ~busy, n_docs)
+            n_needed = max(-(-counts.sum() // overlap), counts.max())
+            if n_needed > len(pool):
+                raise NotEnoughReviews(
+                    f'{n_needed} documents needed, {len(pool)} available')
+            docs = rng.choice(pool, size=n_needed, replace=False)
+            order = rng.permutation(len(codes))
+            codes, counts = codes[order], counts[order]
+            # deal the documents round robin: the slots of an annotator are
+            # contiguous, so it never gets the same document twice
+            slots = docs[np.arange(counts.sum()) % n_needed]
+            for code, chunk in zip(codes.tolist(),
+                                   np.split(slots, np.cumsum(counts)[:-1])):
+                assignments[self.annotators.values[code]] = \
+                    self.documents.decode(chunk)
+        planned = {}
+        review_assignments = {}
+        for reviewer_id, reviewee_id, n in reviews:
+            reviewer, reviewee = self._code(reviewer_id), \
+                self._code(reviewee_id)
+            taken = planned.get(reviewer, np.zeros_like(self.task_docs))
+            bits = self.seen[reviewee] & ~(
+                self.seen[reviewer] | self.pending[reviewer] | taken)
+            pool = _members(bits, n_docs)
+            if n > len(pool):
+                raise NotEnoughReviews(
+                    f'{n} documents requested, {len(pool)} available')
+            docs = rng.choice(pool, size=n, replace=False)
+            planned[reviewer] = taken | _bitsets(
+                np.zeros(n), docs, 1, len(self.task_docs) * 8)[0]
+            review_assignments[(reviewer_id, reviewee_id)] = \
+                self.documents.decode(docs)
+        return assignments, review_assignments
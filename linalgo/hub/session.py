@@ -0,0 +1,49 @@
+import requests
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# (connect, read) timeouts in seconds applied to every request
+DEFAULT_TIMEOUT = (3.05, 60)
+# statuses on which idempotent requests are retried with exponential backoff
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def create_session(token, pool_size=10, max_retries=3, backoff_factor=0.5):
+    """
+    Create a keep-alive session with a connection pool and retry policy.
+
+    Parameters
+    ----------
+    token: str
+        The hub API token, sent once per session in the `Authorization` header
+    pool_size: int
+        Maximum number of connections kept alive per host
+    max_retries: int
+        Number of retries on connection errors and `RETRY_STATUSES`. Only
+        idempotent methods (GET, PUT, DELETE, ...) are retried, and read
+        timeouts are never retried since the server may still be working.
+    backoff_factor: float
+        Sleep `backoff_factor * 2 ** (retry - 1)` seconds between retries. A
+        `Retry-After` header sent by the server takes precedence.
+
+    Return
+    ------
+    A `requests.Session`
+    """
+    session = requests.Session()
+    session.headers['Authorization'] = f"Token {token}"
+    retry = Retry(
+        total=max_retries,
+        read=False,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
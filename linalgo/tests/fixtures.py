@@ -0,0 +1,215 @@
+import csv
+import io
+import json
+import threading
+import time
+import zipfile
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+import numpy as np
+import pandas as pd
+
+from linalgo.annotate.models import Annotation, Annotator, Document, Task
+
+
+def zip_csv(rows, name='export.csv'):
+    """Build a zipped csv export like the ones served by the hub."""
+    buffer = io.StringIO()
+    if len(rows):
+        writer = csv.DictWriter(buffer, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as root:
+        root.writestr(name, buffer.getvalue())
+    return archive.getvalue()
+
+
+def paginated(rows, max_page_size=1000, count=True):
+    """
+    A route handler paginating `rows` like the hub's page number pagination.
+    """
+    def handler(request):
+        page = int(request.query.get('page', 1))
+        page_size = min(int(request.query.get('page_size', 100)), max_page_size)
+        start = (page - 1) * page_size
+        results = rows[start:start + page_size]
+        next_url = None
+        if start + page_size < len(rows):
+            query = {**request.query, 'page': page + 1}
+            next_url = (f"http://{request.headers['Host']}{request.path}?"
+                        f"{urlencode(query)}")
+        payload = {'next': next_url, 'results': results}
+        if count:
+            payload['count'] = len(rows)
+        return 200, payload
+    return handler
+
+
+class StubRequest:
+
+    def __init__(self, method, path, query, headers, body):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def _dispatch(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length) if length else b''
+        request = StubRequest(self.command, url.path, dict(parse_qsl(url.query)),
+                              self.headers, body)
+        with self.server.lock:
+            self.server.requests.append(request)
+            self.server.in_flight += 1
+            self.server.max_in_flight = max(
+                self.server.max_in_flight, self.server.in_flight)
+        try:
+            if self.server.delay:
+                time.sleep(self.server.delay)
+            route = self.server.routes.get((self.command, url.path))
+            if route is None:
+                status, payload, headers = 404, {'detail': 'Not found.'}, {}
+            else:
+                status, payload, headers = route(request)
+        finally:
+            with self.server.lock:
+                self.server.in_flight -= 1
+        if isinstance(payload, (bytes, bytearray)):
+            content_type = 'application/octet-stream'
+        else:
+            payload = json.dumps(payload).encode('utf-8')
+            content_type = 'application/json'
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _dispatch
+
+
+class StubServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # clients hanging up early (e.g. on timeouts) are expected
+        pass
+
+
+class StubHub:
+    """
+    A local stand-in for the hub API that counts TCP connections.
+
+    Routes are registered with `route(method, path, handler)` where `handler`
+    takes a `StubRequest` and returns `(status, payload)` or
+    `(status, payload, headers)`. Dict and list payloads are sent as JSON,
+    bytes are sent as is.
+    """
+
+    def __init__(self, delay=0):
+        self.server = StubServer(('127.0.0.1', 0), StubHandler)
+        self.server.lock = threading.Lock()
+        self.server.connections = 0
+        self.server.in_flight = 0
+        self.server.max_in_flight = 0
+        self.server.requests = []
+        self.server.routes = {}
+        self.server.delay = delay
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f'http://{host}:{port}'
+
+    @property
+    def connections(self):
+        return self.server.connections
+
+    @property
+    def requests(self):
+        return self.server.requests
+
+    @property
+    def max_in_flight(self):
+        return self.server.max_in_flight
+
+    def route(self, method, path, handler):
+        def wrapper(request):
+            res = handler(request)
+            if len(res) == 2:
+                return res[0], res[1], {}
+            return res
+        self.server.routes[(method, path)] = wrapper
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+def make_schedule(n_rows, n_docs, n_annotators, n_annotated=0, seed=0):
+    """
+    A task with `n_docs` documents and `n_annotators` annotators, and a
+    random schedule of `n_rows` document statuses like the ones returned by
+    `LinalgoClient.get_schedule`. The first `n_annotated` documents have an
+    annotation.
+    """
+    rng = np.random.default_rng(seed)
+    task = Task(unique_id=f'schedule-task-{seed}')
+    task.documents = [Document(unique_id=f'doc-{i}') for i in range(n_docs)]
+    task.annotators = [Annotator(unique_id=f'annotator-{j}')
+                       for j in range(n_annotators)]
+    for doc in task.documents[:n_annotated]:
+        task.annotations.append(Annotation(
+            entity='entity', document=doc, annotator=task.annotators[0],
+            task=task))
+    seconds = rng.integers(0, 365 * 86400, n_rows)
+    timestamps = np.datetime64('2021-01-01T00:00:00') + seconds
+    schedule = pd.DataFrame({
+        'id': np.char.add('status-', np.arange(n_rows).astype(str)),
+        'document': np.char.add('doc-', rng.integers(
+            0, n_docs, n_rows).astype(str)),
+        'annotator': np.char.add('annotator-', rng.integers(
+            0, n_annotators, n_rows).astype(str)),
+        'status': rng.choice(['A', 'C'], n_rows),
+        'timestamp': np.char.add(
+            np.datetime_as_string(timestamps, unit='s'), 'Z'),
+    })
+    return task, schedule
@@ -0,0 +1,86 @@
+import asyncio
+import time
+import unittest
+
+from linalgo.annotate.models import Annotation, Document, Registry, Task
+from linalgo.annotate.test.fixtures import ANNOTATIONS, DOCUMENTS
+from linalgo.hub.async_client import AsyncLinalgoClient, SyncLinalgoClient
+from .fixtures import StubHub, zip_csv
+
+TASK_ID = ANNOTATIONS[0]['task']
+DELAY = 0.2
+
+
+def add_task_routes(hub):
+    task = {'id': TASK_ID, 'name': 'task', 'description': '', 'entities': [],
+            'corpora': [], 'annotators': []}
+    annotator = {'id': ANNOTATIONS[0]['annotator'], 'name': 'bot',
+                 'model': None}
+    entity = {'id': ANNOTATIONS[0]['entity'], 'title': 'label',
+              'color': 'ff0000'}
+    hub.route('GET', f'/tasks/{TASK_ID}/', lambda r: (200, task))
+    hub.route('GET', '/annotators/', lambda r: (200, {'results': [annotator]}))
+    hub.route('GET', '/entities', lambda r: (200, {'results': [entity]}))
+    hub.route('GET', '/documents/export/', lambda r: (200, zip_csv(DOCUMENTS)))
+    hub.route('GET', '/annotations/export/',
+              lambda r: (200, zip_csv(ANNOTATIONS)))
+
+
+class TestAsyncClient(unittest.TestCase):
+
+    def setUp(self):
+        self.hub = StubHub(delay=DELAY).start()
+        add_task_routes(self.hub)
+
+    def tearDown(self):
+        self.hub.stop()
+
+    def test_get_task_concurrently(self):
+        async def main():
+            async with AsyncLinalgoClient('token', self.hub.url) as client:
+                return await client.get_task(TASK_ID)
+        start = time.time()
+        task = asyncio.run(main())
+        elapsed = time.time() - start
+        self.assertEqual(len(task.documents), 1)
+        self.assertEqual(len(task.annotations), 1)
+        self.assertEqual(task.annotations[0].document, task.documents[0])
+        self.assertEqual(self.hub.max_in_flight, 4)
+        # the task itself, then 4 concurrent fetches
+        self.assertLess(elapsed, 4 * DELAY)
+
+    def test_bounded_concurrency(self):
+        async def main():
+            async with AsyncLinalgoClient(
+                    'token', self.hub.url, max_concurrency=2) as client:
+                return await client.get_task(TASK_ID)
+        asyncio.run(main())
+        self.assertEqual(self.hub.max_in_flight, 2)
+
+    def test_sync_wrapper(self):
+        with SyncLinalgoClient('token', api_url=self.hub.url) as client:
+            task = client.get_task(TASK_ID)
+            # a second call runs in a fresh event loop
+            self.assertIs(client.get_task(TASK_ID), task)
+        self.assertEqual(task.id, TASK_ID)
+        self.assertEqual(task.entities[0].name, 'label')
+
+    def test_caller_registry(self):
+        async def main(client):
+            task = Task(unique_id='synced-task')
+            await client.async_client.sync_task(task)
+            # from a running event loop, like in a notebook
+            return task, client.get_task(TASK_ID)
+        with Registry() as registry:
+            with SyncLinalgoClient('token', api_url=self.hub.url) as client:
+                synced, task = asyncio.run(main(client))
+            self.assertIs(Task._registry, registry.store(Task))
+            self.assertIs(Task._registry[TASK_ID], task)
+            self.assertIs(Document._registry[DOCUMENTS[0]['id']],
+                          synced.documents[0])
+            self.assertIs(Annotation._registry[ANNOTATIONS[0]['id']],
+                          task.annotations[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+
+from linalgo.annotate.models import Annotation
+from linalgo.annotate.test.fixtures import ANNOTATIONS
+from linalgo.hub.bulk import BulkUploader
+from linalgo.hub.client import LinalgoClient
+from .fixtures import StubHub
+
+
+def make_annotations(n, bad=()):
+    fixture = ANNOTATIONS[0]
+    return [
+        Annotation(
+            unique_id=f'bulk-{i}', entity=fixture['entity'],
+            document=fixture['document'], task=fixture['task'],
+            target=fixture['target'], body='bad' if i in bad else 'ok')
+        for i in range(n)
+    ]
+
+
+class TestBulkUploader(unittest.TestCase):
+
+    def setUp(self):
+        self.hub = StubHub().start()
+        self.created = {}
+        self.hub.route('POST', '/annotations/', self.create)
+        self.client = LinalgoClient(token='secret', api_url=self.hub.url)
+        self.uploader = BulkUploader(
+            self.client, chunk_size=100, backoff_factor=0)
+
+    def tearDown(self):
+        self.client.close()
+        self.hub.stop()
+
+    def create(self, request):
+        items = request.json()
+        if any(item['body'] == 'bad' for item in items):
+            return 400, {'detail': 'invalid body'}
+        self.created.update((item['id'], item) for item in items)
+        return 201, [item['id'] for item in items]
+
+    def test_chunks(self):
+        report = self.uploader.upload_annotations(make_annotations(250))
+        self.assertTrue(report.ok)
+        self.assertEqual(report.n_chunks, 3)
+        self.assertEqual(len(self.created), 250)
+        self.assertLessEqual(self.hub.connections, 3)
+        item = self.created['bulk-0']
+        annotation = Annotation.from_dict(item)
+        self.assertEqual(annotation.target.selectors[0].width,
+                         ANNOTATIONS[0]['target']['selector'][0]['width'])
+
+    def test_max_chunk_bytes(self):
+        self.uploader.max_chunk_bytes = 2000
+        chunks = list(self.uploader.chunks(
+            (i, b'x' * 499) for i in range(10)))
+        self.assertEqual([len(c) for c in chunks], [3, 3, 3, 1])
+
+    def test_partial_failure(self):
+        report = self.uploader.upload_annotations(
+            make_annotations(250, bad={7, 180}))
+        self.assertEqual(set(report.failed), {'bulk-7', 'bulk-180'})
+        self.assertEqual(len(report.succeeded), 248)
+        self.assertEqual(len(self.created), 248)
+
+    def test_retry_is_idempotent(self):
+        statuses = [503]
+        create = self.create
+
+        def flaky(request):
+            if len(statuses):
+                return statuses.pop(), {}
+            return create(request)
+        self.hub.route('POST', '/annotations/', flaky)
+        report = self.uploader.upload_annotations(make_annotations(10))
+        self.assertTrue(report.ok)
+        self.assertEqual(report.n_retries, 1)
+        keys = [r.headers['Idempotency-Key'] for r in self.hub.requests]
+        self.assertEqual(len(keys), 2)
+        self.assertEqual(keys[0], keys[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import tempfile
+import unittest
+
+from linalgo.annotate.test.fixtures import ANNOTATIONS, DOCUMENTS
+from linalgo.hub.cache import ExportCache
+from linalgo.hub.client import LinalgoClient
+from .fixtures import StubHub, zip_csv
+
+TASK_ID = ANNOTATIONS[0]['task']
+
+
+def conditional(payload, etag):
+    def handler(request):
+        if request.headers.get('If-None-Match') == etag:
+            return 304, b'', {'ETag': etag}
+        return 200, payload, {'ETag': etag}
+    return handler
+
+
+class TestExportCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.hub = StubHub().start()
+        self.export = zip_csv(ANNOTATIONS)
+        self.hub.route('GET', '/annotations/export/',
+                       conditional(self.export, '"v1"'))
+        self.client = LinalgoClient(
+            token='secret', api_url=self.hub.url,
+            cache=ExportCache(self.dir.name))
+
+    def tearDown(self):
+        self.client.close()
+        self.hub.stop()
+        self.dir.cleanup()
+
+    def test_revalidate(self):
+        a1 = self.client.get_task_annotations(TASK_ID)
+        a2 = self.client.get_task_annotations(TASK_ID)
+        self.assertEqual(a1, a2)
+        self.assertNotIn('If-None-Match', self.hub.requests[0].headers)
+        self.assertEqual(self.hub.requests[1].headers['If-None-Match'], '"v1"')
+        self.assertEqual(len(self.client.cache), 1)
+
+    def test_persistent(self):
+        self.client.get_task_annotations(TASK_ID)
+        cache = ExportCache(self.dir.name)
+        key = cache.key(TASK_ID, 'annotations-export', self.hub.url)
+        self.assertEqual(cache.get(key)['etag'], '"v1"')
+        self.assertEqual(cache.get(key)['size'], len(self.export))
+
+    def test_evicted_after_revalidation(self):
+        a1 = self.client.get_task_annotations(TASK_ID)
+        key = self.client.cache.key(
+            TASK_ID, 'annotations-export', self.hub.url)
+        os.remove(self.client.cache._file(key))
+        self.assertEqual(self.client.get_task_annotations(TASK_ID), a1)
+        self.assertEqual(self.hub.requests[1].headers['If-None-Match'], '"v1"')
+        self.assertNotIn('If-None-Match', self.hub.requests[2].headers)
+        self.assertEqual(len(self.client.cache), 1)
+        # a 304 without any cache entry
+        self.client.cache.clear()
+        self.client.cache.headers = lambda key: {'If-None-Match': '"v1"'}
+        self.assertEqual(self.client.get_task_annotations(TASK_ID), a1)
+        self.assertNotIn('If-None-Match', self.hub.requests[-1].headers)
+
+    def test_shared_between_hubs(self):
+        with StubHub() as hub:
+            hub.route('GET', '/annotations/export/',
+                      conditional(zip_csv(ANNOTATIONS[:1]), '"v1"'))
+            client = LinalgoClient(token='secret', api_url=hub.url,
+                                   cache=self.client.cache)
+            self.client.get_task_annotations(TASK_ID)
+            self.assertEqual(len(client.get_task_annotations(TASK_ID)), 1)
+            self.assertEqual(len(self.client.cache), 2)
+            self.assertEqual(len(self.client.get_task_annotations(TASK_ID)),
+                             len(ANNOTATIONS))
+            client.session.close()
+
+    def test_invalidate(self):
+        self.hub.route('GET', '/documents/export/',
+                       conditional(zip_csv(DOCUMENTS), '"v1"'))
+        self.client.get_task_annotations(TASK_ID)
+        self.client.get_task_documents(TASK_ID)
+        self.assertEqual(self.client.cache.invalidate(
+            TASK_ID, 'documents-export'), 1)
+        self.assertEqual(self.client.cache.invalidate(TASK_ID), 1)
+        self.client.get_task_annotations(TASK_ID)
+        self.assertNotIn('If-None-Match', self.hub.requests[-1].headers)
+
+    def test_lru_eviction(self):
+        cache = ExportCache(self.dir.name, max_size=25)
+        cache.store('t1', 'e', [b'0123456789'])
+        cache.store('t2', 'e', [b'0123456789'])
+        cache.open(cache.key('t1', 'e')).close()
+        cache.store('t3', 'e', [b'0123456789'])
+        self.assertIn(cache.key('t1', 'e'), cache)
+        self.assertNotIn(cache.key('t2', 'e'), cache)
+        self.assertIn(cache.key('t3', 'e'), cache)
+        self.assertEqual(cache.size, 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
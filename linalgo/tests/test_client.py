@@ -0,0 +1,217 @@
+import os
+import time
+import tracemalloc
+import unittest
+
+import requests
+
+from linalgo.annotate.models import Annotation, Task
+from linalgo.annotate.test.fixtures import ANNOTATIONS
+from linalgo.hub.client import LinalgoClient
+from .fixtures import StubHub, paginated, zip_csv
+
+
+class TestClientSession(unittest.TestCase):
+
+    def setUp(self):
+        self.hub = StubHub().start()
+        self.hub.route('GET', '/tasks/', lambda r: (200, {'results': []}))
+        self.client = LinalgoClient(
+            token='secret', api_url=self.hub.url, backoff_factor=0)
+
+    def tearDown(self):
+        self.client.close()
+        self.hub.stop()
+
+    def test_connection_reuse(self):
+        for _ in range(20):
+            self.client.request(f'{self.hub.url}/tasks/')
+        self.assertEqual(len(self.hub.requests), 20)
+        self.assertEqual(self.hub.connections, 1)
+
+    def test_auth_header(self):
+        self.client.request(f'{self.hub.url}/tasks/')
+        headers = self.hub.requests[0].headers
+        self.assertEqual(headers['Authorization'], 'Token secret')
+
+    def test_retry_on_server_error(self):
+        statuses = [503, 429, 200]
+        self.hub.route('GET', '/flaky/', lambda r: (statuses.pop(0), {}))
+        self.client.request(f'{self.hub.url}/flaky/')
+        self.assertEqual(len(self.hub.requests), 3)
+
+    def test_no_retry_on_post(self):
+        self.hub.route('POST', '/annotations/', lambda r: (503, {}))
+        res = self.client.create_annotations([])
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(len(self.hub.requests), 1)
+
+    def test_timeout(self):
+        self.hub.server.delay = 0.5
+        with self.assertRaises(requests.exceptions.Timeout):
+            self.client.request(f'{self.hub.url}/tasks/', timeout=0.1)
+
+
+class TestPagination(unittest.TestCase):
+
+    def setUp(self):
+        self.rows = [{'id': i} for i in range(10000)]
+        self.hub = StubHub().start()
+        self.client = LinalgoClient(token='secret', api_url=self.hub.url)
+
+    def tearDown(self):
+        self.client.close()
+        self.hub.stop()
+
+    def test_parallel_pages(self):
+        self.hub.route('GET', '/document-status/', paginated(self.rows))
+        self.client.pool_size = 10
+        self.hub.server.delay = 0.1
+        start = time.time()
+        schedule = self.client.get_schedule(Task(unique_id='task'))
+        elapsed = time.time() - start
+        self.assertEqual(schedule, self.rows)
+        self.assertEqual(self.hub.requests[0].query['task'], 'task')
+        self.assertEqual(self.hub.max_in_flight, 9)
+        # first page, then 9 pages over 10 workers
+        self.assertLess(elapsed, 4 * 0.1)
+
+    def test_server_page_size_cap(self):
+        self.hub.route(
+            'GET', '/annotators/', paginated(self.rows, max_page_size=300))
+        results = self.client.request_all(f'{self.hub.url}/annotators/')
+        self.assertEqual(results, self.rows)
+        self.assertEqual(len(self.hub.requests), 34)
+
+    def test_follow_next_without_count(self):
+        self.hub.route('GET', '/entities', paginated(
+            self.rows, max_page_size=2000, count=False))
+        results = self.client.paginate(
+            f'{self.hub.url}/entities', page_size=2000)
+        self.assertEqual(next(results), self.rows[0])
+        self.assertEqual(len(self.hub.requests), 1)
+        self.assertEqual(list(results), self.rows[1:])
+        self.assertEqual(len(self.hub.requests), 5)
+
+
+class TestStreamingExport(unittest.TestCase):
+
+    def setUp(self):
+        self.hub = StubHub().start()
+        self.client = LinalgoClient(token='secret', api_url=self.hub.url)
+
+    def tearDown(self):
+        self.client.close()
+        self.hub.stop()
+
+    def test_iter_task_annotations(self):
+        export = zip_csv(ANNOTATIONS)
+        self.hub.route('GET', '/annotations/export/', lambda r: (200, export))
+        annotations = self.client.iter_task_annotations(ANNOTATIONS[0]['task'])
+        annotation = next(annotations)
+        self.assertIsInstance(annotation, Annotation)
+        self.assertEqual(annotation.id, ANNOTATIONS[0]['id'])
+        self.assertEqual(list(annotations), [])
+
+    def test_close_early(self):
+        export = zip_csv(ANNOTATIONS)
+        self.hub.route('GET', '/annotations/export/', lambda r: (200, export))
+        url = f'{self.hub.url}/annotations/export/'
+        rows = self.client.request_csv(url)
+        spool = rows._spool
+        del rows
+        self.assertTrue(spool.closed)
+        rows = self.client.request_csv(url)
+        spool = rows._spool
+        self.assertEqual(next(rows)['id'], ANNOTATIONS[0]['id'])
+        del rows
+        self.assertTrue(spool.closed)
+        with self.client.request_csv(url) as rows:
+            next(rows)
+        self.assertTrue(rows._spool.closed)
+
+    def test_bounded_memory(self):
+        # incompressible rows so the archive is as large as the csv
+        rows = [{'id': i, 'content': os.urandom(512).hex()}
+                for i in range(20000)]
+        export = zip_csv(rows)
+        del rows
+        self.hub.route('GET', '/documents/export/', lambda r: (200, export))
+        url = f'{self.hub.url}/documents/export/'
+        tracemalloc.start()
+        try:
+            n_rows = sum(1 for _ in self.client.request_csv(url))
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(n_rows, 20000)
+        self.assertGreater(len(export), 10 * 2 ** 20)
+        self.assertLess(peak, 4 * 2 ** 20)
+
+
+class TestBulkAssignment(unittest.TestCase):
+
+    def setUp(self):
+        self.hub = StubHub().start()
+        self.statuses = {}
+
+        def create(request):
+            status_id = f'status-{len(self.statuses)}'
+            self.statuses[status_id] = request.body
+            return 201, {'id': status_id}
+        self.hub.route('POST', '/document-status/', create)
+        for i in range(3):
+            self.hub.route('DELETE', f'/document-status/status-{i}/',
+                           lambda r: (204, b''))
+        self.client = LinalgoClient(token='secret', api_url=self.hub.url)
+
+    def tearDown(self):
+        self.client.close()
+        self.hub.stop()
+
+    def test_assign_many(self):
+        assignments = {'a1': {'d1', 'd2'}, 'a2': {'d3'}}
+        report = self.client.assign_many(assignments, 'task')
+        self.assertTrue(report.ok)
+        self.assertEqual(sorted(report.succeeded),
+                         ['status-0', 'status-1', 'status-2'])
+        self.assertLessEqual(self.hub.connections, 3)
+
+    def test_dry_run(self):
+        schedule = [{'document': 'd1', 'annotator': 'a1', 'type': 'R',
+                     'status': 'C', 'reviewee': 'a2'},
+                    {'document': 'd2', 'annotator': 'a1', 'type': 'R',
+                     'status': 'C', 'reviewee': 'a3'}]
+        assignments = {('a1', 'a2'): {'d1', 'd2'}}
+        report = self.client.assign_many(
+            assignments, 'task', assignment_type='R', schedule=schedule,
+            dry_run=True)
+        statuses = report.planned
+        self.assertEqual(len(statuses), 1)
+        self.assertEqual(statuses[0]['document'], 'd2')
+        self.assertEqual(statuses[0]['reviewee'], 'a2')
+        self.assertEqual(report.succeeded, [])
+        self.assertEqual(
+            self.client.unassign_many(['status-0'], dry_run=True).planned,
+            ['status-0'])
+        self.assertEqual(len(self.hub.requests), 0)
+
+    def test_unexpected_response(self):
+        self.hub.route('POST', '/document-status/', lambda r: (201, b''))
+        report = self.client.assign_many(
+            {('a1', 'a2'): ['d1'], ('a1', 'a3'): ['d1']}, 'task',
+            assignment_type='R')
+        self.assertEqual(report.succeeded, [])
+        self.assertEqual(set(report.failed),
+                         {('d1', ('a1', 'a2')), ('d1', ('a1', 'a3'))})
+        self.assertEqual(len(self.hub.requests), 2)
+
+    def test_unassign_many(self):
+        report = self.client.unassign_many(
+            ['status-0', 'status-1', 'status-9'])
+        self.assertEqual(report.succeeded, ['status-0', 'status-1'])
+        self.assertIn('status-9', report.failed)
+
+
+if __name__ == '__main__':
+    unittest.main()
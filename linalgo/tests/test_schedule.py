@@ -1,10 +1,17 @@
 import os, unittest
+from datetime import datetime, timezone
+import time
+import warnings
 
+import numpy as np
 import pandas as pd
 
 
+from linalgo.annotate.models import Annotation, Document, Registry
 from linalgo.hub.client import LinalgoClient
-from linalgo.hub.scheduler import Scheduler
+from linalgo.hub.scheduler import AnnotatorNotFound, NotEnoughReviews, \
+    PriorityTree, Scheduler
+from .fixtures import make_schedule
 
 
 class TestSchedule(unittest.TestCase):
@@ -21,5 +28,271 @@ class TestSchedule(unittest.TestCase):
             task.get_id('precious.figueroa'), task.get_id('wallie'), n=20)
 
 
+def naive_pools(task, schedule, reviewer, reviewee, start=None, end=None):
+    """The review and assignment pools computed with python sets."""
+    ts = pd.to_datetime(schedule['timestamp'], utc=True)
+    busy = set(schedule.loc[(schedule['annotator'] == reviewer) &
+                            schedule['status'].isin(['A', 'C']), 'document'])
+    idx = (schedule['annotator'] == reviewee) & (schedule['status'] == 'C')
+    if start is not None:
+        idx &= ts >= pd.Timestamp(start)
+    if end is not None:
+        idx &= ts < pd.Timestamp(end)
+    review = set(schedule.loc[idx, 'document']) - busy
+    annotated = {a.document.id for a in task.annotations}
+    unseen = {d.id for d in task.documents} - annotated
+    return review, unseen - busy, unseen
+
+
+class TestScheduler(unittest.TestCase):
+
+    def setUp(self):
+        with Registry():
+            self.task, self.schedule = make_schedule(
+                5000, 1000, 10, n_annotated=100)
+        self.scheduler = Scheduler(self.task, self.schedule)
+
+    def test_pools(self):
+        review, assign, unseen = naive_pools(
+            self.task, self.schedule, 'annotator-1', 'annotator-2')
+        self.assertEqual(
+            set(self.scheduler.random_review('annotator-1', 'annotator-2')),
+            review)
+        self.assertEqual(self.scheduler.random_assign(
+            'annotator-1', len(assign)), assign)
+        self.assertEqual(
+            self.scheduler.unseen_documents(len(unseen)), unseen)
+        docs = self.scheduler.random_review(
+            'annotator-1', 'annotator-2', n=10)
+        self.assertEqual(len(docs), 10)
+        self.assertTrue(docs <= review)
+
+    def test_date_window(self):
+        start, end = '2021-03-01T00:00:00Z', '2021-06-01T00:00:00Z'
+        review, _, _ = naive_pools(self.task, self.schedule, 'annotator-1',
+                                   'annotator-2', start, end)
+        self.assertEqual(set(self.scheduler.random_review(
+            'annotator-1', 'annotator-2', start_date=start, end_date=end)),
+            review)
+        self.assertEqual(set(self.scheduler.random_review(
+            'annotator-1', 'annotator-2',
+            start_date=datetime(2021, 3, 1, tzinfo=timezone.utc),
+            end_date=datetime(2021, 6, 1, tzinfo=timezone.utc))), review)
+
+    def test_stratified_review(self):
+        start, end = '2021-01-01T00:00:00Z', '2021-12-01T00:00:00Z'
+        review, _, _ = naive_pools(self.task, self.schedule, 'annotator-1',
+                                   'annotator-2', start, end)
+        docs = self.scheduler.random_review(
+            'annotator-1', 'annotator-2', n=22, start_date=start,
+            end_date=end, strata=11)
+        self.assertEqual(len(docs), 22)
+        self.assertTrue(docs <= review)
+        schedule = self.schedule[
+            (self.schedule['annotator'] == 'annotator-2') &
+            (self.schedule['status'] == 'C') &
+            self.schedule['document'].isin(docs)]
+        start_, end_ = pd.Timestamp(start), pd.Timestamp(end)
+        timestamps = pd.to_datetime(schedule['timestamp'])
+        timestamps = timestamps[(timestamps >= start_) & (timestamps < end_)]
+        timestamps = timestamps.groupby(schedule['document']).max()
+        buckets = (timestamps - start_) // ((end_ - start_) / 11)
+        self.assertEqual(buckets.value_counts().tolist(), [2] * 11)
+        self.assertEqual(set(self.scheduler.random_review(
+            'annotator-1', 'annotator-2', start_date=start, end_date=end,
+            strata=3)), review)
+        with self.assertRaises(NotEnoughReviews):
+            self.scheduler.random_review(
+                'annotator-1', 'annotator-2', n=len(review) + 1,
+                start_date=start, end_date=end, strata=3)
+
+    def test_missing_timestamps(self):
+        schedule = self.schedule.copy()
+        completed = schedule.index[
+            (schedule['annotator'] == 'annotator-2') &
+            (schedule['status'] == 'C')]
+        schedule.loc[completed[:20], 'timestamp'] = None
+        scheduler = Scheduler(self.task, schedule)
+        review = scheduler.random_review('annotator-1', 'annotator-2')
+        self.assertIsInstance(review, set)
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            stratified = scheduler.random_review(
+                'annotator-1', 'annotator-2', strata=4)
+        self.assertIsInstance(stratified, set)
+        self.assertEqual(stratified, set(scheduler.random_review(
+            'annotator-1', 'annotator-2',
+            start_date='2000-01-01T00:00:00Z')))
+        self.assertTrue(stratified <= review)
+
+    def test_errors(self):
+        with self.assertRaises(AnnotatorNotFound):
+            self.scheduler.random_assign('unknown', 1)
+        with self.assertRaises(NotEnoughReviews):
+            self.scheduler.unseen_documents(1001)
+
+    def test_plan(self):
+        with Registry():
+            self.task, self.schedule = make_schedule(
+                2000, 2000, 10, n_annotated=100)
+        self.scheduler = Scheduler(self.task, self.schedule)
+        quotas = {f'annotator-{j}': 20 + j for j in range(10)}
+        assignments, reviews = self.scheduler.plan(
+            quotas, overlap=3, reviews=[('annotator-1', 'annotator-2', 5),
+                                        ('annotator-1', 'annotator-3', 5)],
+            seed=0)
+        self.assertEqual({a: len(d) for a, d in assignments.items()}, quotas)
+        busy = set(self.schedule['document']) | \
+            {a.document.id for a in self.task.annotations}
+        counts = {}
+        for annotator, docs in assignments.items():
+            self.assertEqual(len(set(docs)), len(docs))
+            self.assertFalse(set(docs) & busy)
+            for doc in docs:
+                counts[doc] = counts.get(doc, 0) + 1
+        self.assertEqual(max(counts.values()), 3)
+        self.assertEqual(len(counts), -(-sum(quotas.values()) // 3))
+        review_12, _, _ = naive_pools(
+            self.task, self.schedule, 'annotator-1', 'annotator-2')
+        docs_12 = reviews[('annotator-1', 'annotator-2')]
+        docs_13 = reviews[('annotator-1', 'annotator-3')]
+        self.assertTrue(set(docs_12) <= review_12)
+        self.assertFalse(set(docs_12) & set(docs_13))
+        self.assertEqual(self.scheduler.plan(
+            quotas, overlap=3, reviews=[('annotator-1', 'annotator-2', 5)],
+            seed=0)[0], assignments)
+        with self.assertRaises(NotEnoughReviews):
+            self.scheduler.plan(100)
+
+    def test_update(self):
+        schedule = self.schedule
+        scheduler = Scheduler(self.task, schedule[:3000])
+        scheduler.random_review('annotator-1', 'annotator-2',
+                                start_date='2021-02-01T00:00:00Z')
+        scheduler.update(schedule[3000:], unassigned=schedule['id'][:500])
+        changed = schedule[1000:2000].assign(status='C')
+        scheduler.update(changed, documents=['doc-new'],
+                         annotated=['doc-999'])
+        with Registry():
+            self.task.documents.append(Document(unique_id='doc-new'))
+            self.task.annotations.append(Annotation(
+                entity='entity', document='doc-999', task=self.task))
+        expected = Scheduler(
+            self.task, pd.concat([schedule[500:1000], changed,
+                                  schedule[2000:]]))
+        self.assertEqual(set(scheduler.unseen_documents()),
+                         set(expected.unseen_documents()))
+        self.assertIn('doc-new', scheduler.unseen_documents())
+        for a, b in [('annotator-1', 'annotator-2'),
+                     ('annotator-3', 'annotator-4')]:
+            self.assertEqual(set(scheduler.random_review(a, b)),
+                             set(expected.random_review(a, b)))
+            window = {'start_date': '2021-02-01T00:00:00Z',
+                      'end_date': '2021-08-01T00:00:00Z'}
+            self.assertEqual(set(scheduler.random_review(a, b, **window)),
+                             set(expected.random_review(a, b, **window)))
+            self.assertEqual(set(scheduler.random_assign(a)),
+                             set(expected.random_assign(a)))
+
+    def test_priority_tree(self):
+        np.random.seed(0)
+        tree = PriorityTree()
+        tree.update(np.arange(10), np.arange(10.))
+        tree.update([3, 12], [0., 5.])
+        self.assertEqual(tree.total, 45 - 3 + 5)
+        self.assertEqual(tree.get([9, 12]).tolist(), [9., 5.])
+        drawn = tree.sample(9)
+        self.assertEqual(sorted(drawn), [1, 2, 4, 5, 6, 7, 8, 9, 12])
+        self.assertEqual(tree.total, 47)
+        self.assertEqual(
+            sorted(tree.sample(5, accept=lambda i: i % 3 == 0)), [6, 9, 12])
+        counts = np.bincount(
+            np.concatenate([tree.sample(1) for _ in range(4700)]),
+            minlength=13)
+        self.assertLess(abs(counts[9] / counts[1] - 9), 3)
+        with self.assertRaises(ValueError):
+            tree.update([0], [-1.])
+
+    def test_weighted(self):
+        np.random.seed(0)
+        _, assign, unseen = naive_pools(
+            self.task, self.schedule, 'annotator-1', 'annotator-2')
+        hot = sorted(assign)[:20]
+        self.scheduler.set_priorities(unseen, np.full(len(unseen), 0.01))
+        self.scheduler.set_priorities(hot, np.full(20, 100.))
+        docs = self.scheduler.random_assign('annotator-1', 20, weighted=True)
+        self.assertGreater(len(docs & set(hot)), 15)
+        self.assertTrue(docs <= assign)
+        docs = self.scheduler.unseen_documents(len(unseen), weighted=True)
+        self.assertEqual(docs, unseen)
+        # all the priority mass outside of the pool
+        self.scheduler.set_priorities(unseen, np.zeros(len(unseen)))
+        docs = self.scheduler.random_assign('annotator-1', 20, weighted=True)
+        self.assertEqual(len(docs), 20)
+        self.assertTrue(docs <= assign)
+        with self.assertRaises(NotEnoughReviews):
+            self.scheduler.random_assign(
+                'annotator-1', len(assign) + 1, weighted=True)
+
+    def test_prioritize(self):
+        doc_ids = sorted(naive_pools(
+            self.task, self.schedule, 'annotator-1', 'annotator-2')[2])[:3]
+        with Registry():
+            annotations = [
+                Annotation(entity='entity', document=doc_id, score=score)
+                for doc_id, score in zip(doc_ids, [0., 2., -1.])]
+        self.scheduler.prioritize_uncertainty(annotations)
+        codes = [self.scheduler.documents.index[d] for d in doc_ids]
+        self.assertEqual(self.scheduler.priorities.get(codes).tolist(),
+                         [1., 1 / 3, .5])
+        with Registry():
+            annotations = [
+                Annotation(entity=e, document=d, annotator=a)
+                for d, e, a in [('doc-1', 'e1', 'a1'), ('doc-1', 'e1', 'a2'),
+                                ('doc-2', 'e1', 'a1'), ('doc-2', 'e2', 'a2')]]
+        self.scheduler.prioritize_disagreement(annotations)
+        codes = [self.scheduler.documents.index[d] for d in ('doc-1', 'doc-2')]
+        self.assertEqual(self.scheduler.priorities.get(codes).tolist(),
+                         [0., .5])
+
+    def test_missing_annotator(self):
+        schedule = self.schedule.copy()
+        schedule.loc[:99, 'annotator'] = None
+        scheduler = Scheduler(self.task, schedule)
+        self.assertNotIn(None, scheduler.annotators.index)
+        self.assertEqual(
+            scheduler.random_assign('annotator-1'),
+            Scheduler(self.task, schedule[100:]).random_assign('annotator-1'))
+
+    def test_unassign_twice(self):
+        schedule = self.schedule
+        completed = schedule[schedule['status'] == 'C']
+        pairs = completed.groupby(['annotator', 'document'])['id']
+        status = completed.loc[pairs.transform('size') == 1].iloc[0]
+        same_pair = (schedule['annotator'] == status['annotator']) & \
+            (schedule['document'] == status['document'])
+        schedule = schedule[~same_pair | (schedule['id'] == status['id'])]
+        scheduler = Scheduler(self.task, schedule)
+        scheduler.update(unassigned=[status['id'], status['id']])
+        scheduler.update(unassigned=[status['id']])
+        expected = Scheduler(
+            self.task, schedule[schedule['id'] != status['id']])
+        self.assertEqual(scheduler.random_assign(status['annotator']),
+                         expected.random_assign(status['annotator']))
+        self.assertIn(status['document'],
+                      scheduler.random_assign(status['annotator']))
+
+    def test_large_schedule(self):
+        with Registry():
+            task, schedule = make_schedule(1000000, 100000, 200)
+            scheduler = Scheduler(task, schedule)
+        start = time.time()
+        for i in range(100):
+            scheduler.random_assign(f'annotator-{i}', 10)
+            scheduler.random_review(f'annotator-{i}', f'annotator-{i + 1}',
+                                    n=10)
+        self.assertLess(time.time() - start, 5)
+
+
 if __name__ == '__main__':
     unittest.main()
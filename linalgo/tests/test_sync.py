@@ -0,0 +1,79 @@
+import unittest
+
+from linalgo.annotate.models import Annotation, Document
+from linalgo.annotate.test.fixtures import ANNOTATIONS, DOCUMENTS
+from linalgo.hub.client import LinalgoClient
+from .fixtures import StubHub, zip_csv
+
+TASK_ID = 'f0b7d3c4-5a6e-4c1b-9d2f-3e4a5b6c7d8e'
+
+
+def annotation(unique_id, document, created, deleted=''):
+    return {**ANNOTATIONS[0], 'id': unique_id, 'document': document,
+            'task': TASK_ID, 'created': created, 'deleted': deleted}
+
+
+def document(unique_id):
+    return {**DOCUMENTS[0], 'id': unique_id}
+
+
+class TestSyncTask(unittest.TestCase):
+
+    def setUp(self):
+        self.hub = StubHub().start()
+        self.documents = [document('sync-doc-1')]
+        self.annotations = [
+            annotation('sync-1', 'sync-doc-1', '2021-01-01T00:00:00+00:00'),
+            annotation('sync-2', 'sync-doc-1', '2021-01-02T00:00:00+00:00'),
+        ]
+        task = {'id': TASK_ID, 'name': 'sync', 'description': '',
+                'entities': [], 'corpora': [], 'annotators': []}
+        empty = {'count': 0, 'next': None, 'results': []}
+        self.hub.route('GET', f'/tasks/{TASK_ID}/', lambda r: (200, task))
+        self.hub.route('GET', '/annotators/', lambda r: (200, empty))
+        self.hub.route('GET', '/entities', lambda r: (200, empty))
+        self.hub.route('GET', '/documents/export/', self.export('documents'))
+        self.hub.route('GET', '/annotations/export/',
+                       self.export('annotations'))
+        self.client = LinalgoClient(token='secret', api_url=self.hub.url)
+
+    def tearDown(self):
+        self.client.close()
+        self.hub.stop()
+
+    def export(self, name):
+        def handler(request):
+            rows = getattr(self, name)
+            since = request.query.get('since')
+            if since is not None:
+                rows = [r for r in rows if r.get('created', since) >= since]
+            return 200, zip_csv(rows)
+        return handler
+
+    def test_sync_task(self):
+        task = self.client.get_task(TASK_ID)
+        self.assertEqual(len(task.annotations), 2)
+        self.documents.append(document('sync-doc-2'))
+        self.annotations = [
+            annotation('sync-2', 'sync-doc-1', '2021-01-02T00:00:00+00:00',
+                       deleted='2021-01-03T00:00:00+00:00'),
+            annotation('sync-3', 'sync-doc-2', '2021-01-03T00:00:00+00:00'),
+        ]
+        self.client.sync_task(task)
+        query = self.hub.requests[-1].query
+        self.assertEqual(query['since'], '2021-01-02T00:00:00+00:00')
+        self.assertEqual(
+            [a.id for a in task.annotations], ['sync-1', 'sync-3'])
+        self.assertEqual(len(task.documents), 2)
+        self.assertEqual(
+            [a.id for a in Document(unique_id='sync-doc-1').annotations],
+            ['sync-1'])
+        self.assertNotIn('sync-2', Annotation._registry)
+        self.client.sync_task(task)
+        query = self.hub.requests[-1].query
+        self.assertEqual(query['since'], '2021-01-03T00:00:00+00:00')
+        self.assertEqual(len(task.annotations), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,5 +8,12 @@ setup(
     version='0.1',
     author='Arnaud Rachez',
     author_email='arnaud@linalgo.com',
-    requires=['numpy', 'scipy'],
+    python_requires='>=3.8',
+    install_requires=[
+        'numpy>=1.20.3',
+        'pandas>=2.0',
+        'Pillow>=6.0',
+        'requests>=2.20.0',
+        'scipy>=1.0',
+    ],
 )